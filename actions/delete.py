@@ -1,47 +1,26 @@
 from utils.db_manager import db_manager, requires_db
+from utils.parsing import parse_query
 from ui import prettier_cli as cli
 
 
+# > rm <id> <id>-<id> tool:<tool> tag:<tag> ...
 @requires_db
-def delete_command(ids_str: str = None):
-    ids = _parse_range(ids_str)
+def delete_command(args: str = None):
+    query = parse_query(args or "")
 
-    del_count = db_manager.delete_command(ids)
+    if not query:
+        return
 
-    if len(ids) == del_count:
-        cli.cout(f"Deleted {del_count} rows.", cli.MsgType.SUCCESS)
-    else:
-        cli.cout(f"Deleted {del_count} rows out of {len(ids)}.", cli.MsgType.WARNING)
-
-
-def _parse_range(string: str):
-    def add_nums(nums):
-        for num in nums:
-            if num not in seen:
-                seen.add(num)
-                result.append(num)
+    if not any(query):
+        cli.cout("Error: specify the ids, tool:<tool> or tag:<tag> to delete.", cli.MsgType.BAD_INPUT)
+        return
 
-    result = []
-    seen = set()
-
-    for part in string.split():
-        if "-" in part:
-            start_str, end_str = part.split("-", maxsplit=1)
-            if not start_str.isdigit() or not end_str.isdigit():
-                return _bad_range_msg(part)
-            start, end = int(start_str), int(end_str)
-            if start > end:
-                return _bad_range_msg(part)
-            add_nums(range(start, end + 1))
-        else:
-            if not part.isdigit():
-                return _bad_range_msg(part)
-            add_nums([int(part)])
-
-    return result
+    ranges, tools, tags = query
+    del_count = db_manager.delete_command(ranges, tools, tags)
 
+    requested = sum(end - start + 1 for start, end in ranges)
+    if tools or tags or del_count == requested:
+        cli.cout(f"Deleted {del_count} rows.", cli.MsgType.SUCCESS)
+    else:
+        cli.cout(f"Deleted {del_count} rows out of {requested}.", cli.MsgType.WARNING)
 
-def _bad_range_msg(part: int):
-    msg = f"\nError: invalid id '{part}'.Specify <int> or <int>-<int>."
-    cli.cout(msg, cli.MsgType.BAD_INPUT)
-    return False
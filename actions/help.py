@@ -12,14 +12,27 @@ def main_help(cmd: str = None):
     cli.cout("    - sheets                     list available sheets")
     cli.cout("    - <sheet>                    select a sheet")
     cli.cout("    - create <sheet>             create an empty sheet")
+    cli.cout("    - maintain                   drop unused tags, refresh statistics, shrink the file")
+    cli.cout("    - dedupe                     merge commands with the same tool and args, keeping their tags")
 
     cli.cout("\nEntries")
     cli.cout("    - ls                         list all commands from sheet")
+    cli.cout("    - ls --page <n>              list one page of commands")
+    cli.cout("    - ls --after <id>            list the page of commands after id")
     cli.cout("    - tool <tool>                list commands from tool")
-    cli.cout("    - tag <tag1> <tag2> ...      list commands from tags")
+    cli.cout("    - tag <tag1> <tag2> ...      list commands from any of the tags")
+    cli.cout("    - tag ... +<tag> -<tag>      require (+) or exclude (-) tags")
+    cli.cout("    - search <term> <term> ...   search commands (supports prefix* and \"phrases\")")
+    cli.cout("    - tool/tag/search ... --all  run the query on every sheet of the vault")
     cli.cout("    - add                        add a command to sheet")
-    cli.cout("    - delete <id1> <id2> ...     delete commands by id")
-    cli.cout("    - cp <id>                    copy command to clipboard")
+    cli.cout("    - add --batch [file]         add `tool | args | desc | tag1,tag2` lines, pasted or from file")
+    cli.cout("    - rm <id> <id>-<id> ...      delete commands by id or id range")
+    cli.cout("    - rm tool:<tool> tag:<tag>   delete every command of a tool or with a tag")
+    cli.cout("    - retag <ids> +<tag> -<tag>  add and remove tags on commands by id, tool: or tag:")
+    cli.cout("    - retag --rename <old> <new> rename a tag, merged if <new> exists")
+    cli.cout("    - cp <id> <id> ...           copy commands to clipboard")
+    cli.cout("    - import <file>              add commands from a .jsonl or .csv file")
+    cli.cout("    - export <file>              write all commands to a .jsonl or .csv file")
 
     cli.cout("\nTags")
     cli.cout("    - tags                       list available tags")
@@ -27,11 +40,16 @@ def main_help(cmd: str = None):
     cli.cout("\nTools")
     cli.cout("    - tools                      list available tools")
 
+    cli.cout("\nStats")
+    cli.cout("    - stats                      show query timings (percentiles per operation and query)")
+    cli.cout("    - stats on/off/reset         turn timings on or off, or clear them")
+    cli.cout("    - stats slow                 show slow queries with their query plan")
+
 
 def edit_tags_help():
     cli.cout("\nEdit tags help")
 
-    cli.cout("    - remove <tag> <tag> ...     remove tags from from command")
-    cli.cout("    - add <tag> <tag> ...        add tags to from command")
-    cli.cout("    - ls                         show current tags of command")
-    cli.cout("\nEnter empty line to confirm changes.")
+    cli.cout("    - rm <tag> <tag> ...         remove tags from command")
+    cli.cout("    - add <tag> <tag> ...        add tags to command")
+    cli.cout("    - ls                         show staged tags of command")
+    cli.cout("\nEnter empty line to review the changes, they are only applied once confirmed.")
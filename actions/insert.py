@@ -1,14 +1,133 @@
-from utils.db_manager import db_manager, requires_db
+import sys
+import time
+
+from os.path import expanduser, expandvars
+from pathlib import Path
 
+from utils.db_manager import db_manager, requires_db
+from utils.settings_manager import settings
+from utils.parsing import is_word
 
 from ui import prettier_cli as cli
 
 
+# > add
+# > add --batch [file]
 @requires_db
-def insert_command(sheet):
+def insert_command(args: str = None):
+    batch, _, file = (args or "").partition(" ")
+    if batch == "--batch":
+        insert_batch(file.strip())
+        return
+
+    sheet = settings.active_sheet.strip()
     tool = cli.cin(f"\n{sheet} / add / tool", words=1, allow_empty=False)
     args = cli.cin(f"\n{sheet} / add / args")
     desc = cli.cin(f"\n{sheet} / add / desc")
-    tags = cli.cin(f"\n{sheet} / add / tag", type=cli.CinType.LIST) + [tool]
+    tags = list(dict.fromkeys(cli.cin(f"\n{sheet} / add / tag", type=cli.CinType.LIST) + [tool]))
+
+    duplicate = db_manager.find_duplicate(tool, args)
+    if duplicate is None:
+        db_manager.add_command(tool, args, desc, tags)
+        return
+
+    cli.cout(f"\nThe command is already in the sheet as {duplicate}.", cli.MsgType.WARNING)
+    answer = cli.cin(f"\n{sheet} / add / merge tags into {duplicate}? (y/n)")
+    if (answer or "").strip().lower() not in ("y", "yes"):
+        cli.cout("Nothing was added.")
+        return
+
+    added = db_manager.retag([(duplicate, duplicate)], add=tags)["tags_added"]
+    cli.cout(f"Added {added} tags to {duplicate}.", cli.MsgType.SUCCESS)
+
+
+# > add --batch [file]
+# one command per line as `tool | args | desc | tag1,tag2`, read from file, piped stdin or pasted
+@requires_db
+def insert_batch(file: str = None):
+    if file:
+        path = Path(expanduser(expandvars(file)))
+        if not path.is_file():
+            cli.cout(f"Error: file '{path}' does not exist.", cli.MsgType.BAD_INPUT)
+            return
+        with path.open(encoding="utf-8") as f:
+            lines = f.read().splitlines()
+    elif not sys.stdin.isatty():
+        lines = sys.stdin.read().splitlines()
+    else:
+        lines = _read_pasted()
+
+    records, errors = [], []
+    for line_num, line in enumerate(lines, 1):
+        if not line.strip() or line.lstrip().startswith("#"):
+            continue
+        record = _parse_line(line)
+        if isinstance(record, str):
+            errors.append((line_num, record))
+        else:
+            records.append(record)
+
+    # nothing is inserted unless every line is valid
+    if errors:
+        for line_num, error in errors[:10]:
+            cli.cout(f"Error: line {line_num}: {error}.", cli.MsgType.BAD_INPUT)
+        if len(errors) > 10:
+            cli.cout(f"... and {len(errors) - 10} more invalid lines.", cli.MsgType.BAD_INPUT)
+        cli.cout("Nothing was added.", cli.MsgType.WARNING)
+        return
+
+    if not records:
+        cli.cout("Error: no commands to add.", cli.MsgType.BAD_INPUT)
+        return
+
+    start = time.perf_counter()
+    result = db_manager.import_commands(records, chunk_size=len(records))  # one transaction
+    elapsed = time.perf_counter() - start
+
+    cli.cout(
+        f"\nAdded {result['inserted']} commands in {elapsed:.2f}s ({len(records) / elapsed:.0f} lines/s).",
+        cli.MsgType.SUCCESS,
+    )
+
+    if result["merged"]:
+        cli.cout(f"Merged the tags of {result['merged']} duplicate commands.", cli.MsgType.WARNING)
+
+
+def _read_pasted() -> list:
+    cli.cout(f"\n{settings.active_sheet} / add / batch (tool | args | desc | tag1,tag2, empty line to finish)")
+    lines = []
+
+    try:
+        while line := input():
+            lines.append(line)
+    except EOFError:
+        pass
+
+    return lines
+
+
+def _parse_line(line: str):
+    """Parse a `tool | args | desc | tag1,tag2` line. Trailing fields may be
+    left out, and when all four are given args keeps any extra '|' (pipelines).
+
+    Returns:
+        dict: record for db_manager.import_commands, or the error as a str
+    """
+    fields = line.split("|")
+
+    if len(fields) > 4:
+        tool, rest = line.split("|", 1)
+        fields = [tool, *rest.rsplit("|", 2)]
+    tool, args, desc, tags = [field.strip() for field in fields] + [""] * (4 - len(fields))
+
+    if not is_word(tool):
+        return "tool must be one word"
+
+    tags = [tag.strip() for tag in tags.replace(",", " ").split()]
 
-    db_manager.add_command(tool, desc, tags, args)
+    return {
+        "tool": tool,
+        "args": args,
+        "desc": desc,
+        "tags": list(dict.fromkeys(tags + [tool])),
+    }
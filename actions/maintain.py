@@ -0,0 +1,36 @@
+from utils.db_manager import db_manager, requires_db
+
+from ui import prettier_cli as cli
+
+
+# > maintain
+@requires_db
+def maintain_sheet():
+    report = db_manager.maintain()
+
+    cli.cout("\nPlanner statistics refreshed (rows, rows per key)")
+    cli.cout_records(
+        ({"table": table, "index": index, "stat": stat} for table, index, stat in report["analyzed"]),
+        lambda record: f"    - {record['index'] or record['table']:<28} {record['stat']}",
+    )
+
+    cli.cout(
+        f"\nRemoved {report['orphan_tags']} unused tags, reclaimed {report['bytes_reclaimed'] / 1024:.1f} KB "
+        f"({report['free_pages']} free pages left).",
+        cli.MsgType.SUCCESS,
+    )
+
+
+# > dedupe
+@requires_db
+def dedupe_sheet():
+    report = db_manager.dedupe()
+
+    if not report["merged"]:
+        cli.cout("No duplicate commands found.")
+        return
+
+    cli.cout(
+        f"Merged {report['merged']} duplicate commands, moving {report['tags_merged']} tags.",
+        cli.MsgType.SUCCESS,
+    )
@@ -1,4 +1,3 @@
-import pyperclip
 import os
 
 from utils.db_manager import db_manager, requires_db
@@ -10,16 +9,35 @@ def clear_screen():
     os.system("clear")
 
 
+# > cp <id> <id> ...
 @requires_db
-def copy_to_clipboard(id: str):
-    if not id.isdigit():
-        cli.cout("Error: id not a positive integer", cli.MsgType.BAD_INPUT)
+def copy_to_clipboard(args: str):
+    ids = (args or "").split()
+
+    if not ids:
+        cli.cout("Error: specify the ids of the commands to copy.", cli.MsgType.BAD_INPUT)
+        return
+
+    if not all(id.isdigit() for id in ids):
+        cli.cout("Error: ids must be positive integers.", cli.MsgType.BAD_INPUT)
         return
 
-    entry = db_manager.get_command_by_id(id)
+    commands = db_manager.get_commands_by_ids(ids)
+    missing = [id for id in ids if int(id) not in commands]
+
+    if missing:
+        cli.cout(f"Error: no command with id {', '.join(missing)}.", cli.MsgType.BAD_INPUT)
+        return
+
+    # one command per line, in the order given
+    text = "\n".join(f"{commands[int(id)]['tool']} {commands[int(id)]['args']}" for id in dict.fromkeys(ids))
+
+    from utils.clipboard import clipboard, ClipboardError
+
+    try:
+        clipboard.copy(text)
+    except ClipboardError as e:
+        cli.cout(f"Error: could not copy to the clipboard ({e}).", cli.MsgType.BAD_INPUT)
+        return
 
-    if not entry:
-        cli.cout(f"Error: id {id} does not exist.", cli.MsgType.BAD_INPUT)
-    else:
-        pyperclip.copy(f"{entry['tool']} {entry['arguments']}")
-        cli.cout("Copied!", cli.MsgType.SUCCESS)
+    cli.cout("Copied!" if len(commands) == 1 else f"Copied {len(commands)} commands!", cli.MsgType.SUCCESS)
@@ -1,12 +1,29 @@
-from utils.db_manager import db_manager, requires_db
-from itertools import cycle
+from utils.db_manager import db_manager, requires_db, SEARCH_MARKS
+from utils.settings_manager import settings
+
+import shlex
 
 from ui import prettier_cli as cli
 
 
+ALL_SHEETS = "--all"
+
+
 # main entry point for querying commands
+def list_commands(tags: str = None, tool: str = None, id: str = None, page: str = None):
+    if _in_vault(tags):
+        _by_tag_in_vault(_drop_all_sheets(tags))
+        return
+
+    if _in_vault(tool):
+        _by_tool_in_vault(_drop_all_sheets(tool))
+        return
+
+    _list_sheet_commands(tags, tool, id, page)
+
+
 @requires_db
-def list_commands(tags: str = None, tool: str = None, id: str = None):
+def _list_sheet_commands(tags: str = None, tool: str = None, id: str = None, page: str = None):
     if tags:
         _by_tag(tags)
         return
@@ -19,7 +36,51 @@ def list_commands(tags: str = None, tool: str = None, id: str = None):
         _by_id(id)
         return
 
-    _all()
+    _all(page)
+
+
+# > search <term1> <term2> ... [--all]
+def search_commands(terms: str):
+    try:
+        terms = shlex.split(terms or "")
+    except ValueError:
+        cli.cout("Error: unbalanced quotes in search terms.", cli.MsgType.BAD_INPUT)
+        return
+
+    in_vault = ALL_SHEETS in terms
+    terms = [term for term in terms if term != ALL_SHEETS]
+
+    if not terms:
+        cli.cout("Error: specify the terms to search for.", cli.MsgType.BAD_INPUT)
+        return
+
+    if in_vault:
+        _search_vault(terms)
+    else:
+        _search_sheet(terms)
+
+
+@requires_db
+def _search_sheet(terms: list):
+    commands = db_manager.search(terms)
+
+    if not commands:
+        cli.cout("No matches found.")
+        return
+
+    _print_matches(commands)
+
+
+def _search_vault(terms: list):
+    results = db_manager.search_vault(terms)
+
+    if not results:
+        cli.cout("No matches found in any sheet.")
+        return
+
+    for sheet, commands in results.items():
+        _print_sheet(sheet)
+        _print_matches(commands, sheet)
 
 
 @requires_db
@@ -31,8 +92,7 @@ def list_tools():
         return
 
     cli.cout("\nAvailable tools:")
-    for tool in tools:
-        cli.cout(f"    - {tool['tool']}")
+    cli.cout_records(({"tool": tool["tool"]} for tool in tools), lambda tool: f"    - {tool['tool']}")
 
 
 @requires_db
@@ -44,8 +104,7 @@ def list_tags():
         return
 
     cli.cout("\nAvailable tags:")
-    for tag in tags:
-        cli.cout(f"    #{tag['tag']}")
+    cli.cout_records(({"tag": tag["tag"]} for tag in tags), _tag_line)
 
 
 @requires_db
@@ -53,30 +112,24 @@ def list_tags_from_cmd(id: int):
     tags = db_manager.get_tags_from_command(id)
 
     cli.cout("\nTags:")
-    for tag in tags:
-        cli.cout(f"    #{tag['tag']}")
+    cli.cout_records(({"tag": tag["tag"]} for tag in tags), _tag_line)
 
 
-# > tag <tag1 tag2 tag3 ...>
+# > tag <tag1 tag2 ...> [+<tag> ...] [-<tag> ...]
 def _by_tag(tags: str):
-    tags = list(dict.fromkeys(tags.split()))
-
-    entries, no_tags = db_manager.get_commands_by_tags(tags)
+    query = _tag_query(tags)
+    if not query:
+        return
 
-    colors = cycle(
-        [
-            color.value
-            for color in cli.Colors
-            if color.value and not color.value == cli.Colors.BLACK
-        ]
-    )
+    commands, no_tags = db_manager.get_commands_by_tags(*query)
 
-    for tag, commands in entries.items():
-        cli.cout(f"\n#{tag}")
-        _print_cmds(commands, fore=next(colors))
+    if commands:
+        _print_tagged(commands)
 
     if no_tags:
-        cli.cout(f"\nTags not found: {" ".join(f"#{tag}" for tag in no_tags)}")
+        cli.cout(f"\nTags not found: {' '.join(f'#{tag}' for tag in no_tags)}")
+        for tag in no_tags:
+            _did_you_mean(tag, db_manager.suggest_tags(tag), "#")
 
 
 # > tool <tool>
@@ -87,31 +140,181 @@ def _by_tool(tool: str):
 
     commands = db_manager.get_commands_by_tool(tool)
 
+    if not commands:
+        cli.cout(f"\nTool not found: {tool}")
+        _did_you_mean(tool, db_manager.suggest_tools(tool))
+        return
+
     _print_cmds(commands)
 
 
+# > tag <tag1 tag2 ...> [+<tag> ...] [-<tag> ...] --all
+def _by_tag_in_vault(tags: str):
+    query = _tag_query(tags)
+    if not query:
+        return
+
+    results, no_tags = db_manager.get_commands_by_tags_in_vault(*query)
+
+    for sheet, commands in results.items():
+        _print_sheet(sheet)
+        _print_tagged(commands, sheet)
+
+    if no_tags:
+        cli.cout(f"\nTags not found in any sheet: {' '.join(f'#{tag}' for tag in no_tags)}")
+
+
+# > tool <tool> --all
+def _by_tool_in_vault(tool: str):
+    if len(tool.split()) != 1:
+        cli.cout("Error: specify only one tool.", cli.MsgType.BAD_INPUT)
+        return
+
+    results = db_manager.get_commands_by_tool_in_vault(tool)
+
+    if not results:
+        cli.cout(f"\nTool not found in any sheet: {tool}")
+        return
+
+    for sheet, commands in results.items():
+        _print_sheet(sheet)
+        _print_cmds(commands, sheet=sheet)
+
+
 # > ls <id>
 def _by_id(id: str):
     if not id.isdigit():
-        cli.cout("Error: id must be a positive integer.")
+        cli.cout("Error: id must be a positive integer.", cli.MsgType.BAD_INPUT)
         return
 
     command = db_manager.get_command_by_id(id)
 
+    if not command:
+        cli.cout(f"Error: command {id} does not exist.", cli.MsgType.BAD_INPUT)
+        return
+
     _print_cmds([command])
 
 
-# > ls
-def _all():
-    entries = db_manager.get_commands()
+# > ls [--page <n> | --after <id>]
+def _all(page: str = None):
+    if not page:
+        with cli.pager():
+            _print_cmds(db_manager.get_commands())
+        return
+
+    option, *value = page.split()
+
+    if option not in ("--page", "--after") or len(value) != 1 or not value[0].isdigit():
+        cli.cout("Error: use ls, ls --page <n> or ls --after <id>.", cli.MsgType.BAD_INPUT)
+        return
+
+    page_size = max(1, int(settings.page_size))
+    value = int(value[0])
+
+    if option == "--page":
+        number = max(1, value)
+        entries = list(db_manager.get_commands(offset=(number - 1) * page_size, limit=page_size))
+    else:
+        number = None
+        entries = list(db_manager.get_commands(after=value, limit=page_size))
+
+    if not entries:
+        cli.cout("\nNo commands in this page.")
+        return
+
     _print_cmds(entries)
 
+    if len(entries) == page_size:
+        next_page = f"ls --page {number + 1} or " if number else ""
+        cli.cout(f"\nMore commands: {next_page}ls --after {entries[-1]['id']}")
+
+
+def _in_vault(args: str) -> bool:
+    return bool(args) and ALL_SHEETS in args.split()
+
+
+def _drop_all_sheets(args: str) -> str:
+    return " ".join(arg for arg in args.split() if arg != ALL_SHEETS)
+
+
+def _print_sheet(sheet: str):
+    cli.cout(f"\n{sheet}", fore=cli.Colors.ORANGE)
+
+
+# splits 'a b +c -d' into tags (any of), required (+) and excluded (-) tags
+def _tag_query(args: str) -> tuple:
+    tags, required, excluded = [], [], []
+
+    for word in (args or "").split():
+        if word[0] == "+" and len(word) > 1:
+            required.append(word[1:])
+        elif word[0] == "-" and len(word) > 1:
+            excluded.append(word[1:])
+        else:
+            tags.append(word)
+
+    if not tags and not required:
+        cli.cout("Error: specify at least one tag to match (<tag> or +<tag>).", cli.MsgType.BAD_INPUT)
+        return None
+
+    return tags, required, excluded
+
+
+def _print_tagged(commands: list, sheet: str = None):
+    cli.cout()
+    cli.cout_records(
+        ({**_record(cmd, sheet), "tags": cmd["tags"]} for cmd in commands),
+        lambda cmd: f"{cmd['id']} # {cmd['tool']} {cmd['args']} -> {cmd['desc']}  #{' #'.join(cmd['tags'])}",
+    )
+
+
+def _print_matches(commands: list, sheet: str = None):
+    if not cli.is_human():
+        unmark = str.maketrans("", "", "".join(SEARCH_MARKS))
+        commands = [
+            {key: cmd[key].translate(unmark) if key != "id" else cmd[key] for key in cmd.keys()}
+            for cmd in commands
+        ]
+        cli.cout_records((_record(cmd, sheet) for cmd in commands), None)
+        return
+
+    cli.cout()
+    cli.cout_lines(
+        cli.assemble(
+            f"{cmd['id']} # ",
+            cli.mark(cmd["tool"], *SEARCH_MARKS),
+            " ",
+            cli.mark(cmd["args"], *SEARCH_MARKS),
+            " -> ",
+            cli.mark(cmd["desc"], *SEARCH_MARKS),
+        )
+        for cmd in commands
+    )
+
+
+def _did_you_mean(name: str, suggestions: list, prefix: str = ""):
+    if suggestions:
+        options = ", ".join(f"{prefix}{suggestion}" for suggestion in suggestions)
+        cli.cout(f"Did you mean {options} instead of {prefix}{name}?", cli.MsgType.WARNING)
+
+
+def _print_cmds(commands, fore: str = cli.Colors.DEFAULT, sheet: str = None):
+    cli.cout()
+    cli.cout_records(
+        (_record(cmd, sheet) for cmd in commands),
+        lambda cmd: f"{cmd['id']} # {cmd['tool']} {cmd['args']} -> {cmd['desc']}",
+        fore=fore,
+    )
+
+
+# machine readable shape of a command, sheet is set in vault-wide listings
+# (the schema allows NULL args and desc)
+def _record(cmd, sheet: str = None) -> dict:
+    record = {"sheet": sheet} if sheet else {}
+    record.update(id=cmd["id"], tool=cmd["tool"], args=cmd["args"] or "", desc=cmd["desc"] or "")
+    return record
+
 
-def _print_cmds(commands: list, fore: str = cli.Colors.DEFAULT):
-    print()
-    for cmd in commands:
-        id = cmd["id"]
-        tool = cmd["tool"]
-        args = cmd["args"]
-        desc = cmd["desc"]
-        cli.cout(f"{id} # {tool} {args} -> {desc}", fore=fore)
+def _tag_line(tag: dict) -> str:
+    return f"    #{tag['tag']}"
@@ -1,3 +1,5 @@
+import time
+
 from utils.db_manager import db_manager, requires_db
 
 from ui import prettier_cli as cli
@@ -28,7 +30,7 @@ def select_sheet(new_sheet: str) -> str:
 
     if not db_manager.change_database(new_sheet):
         cli.cout("Error: sheet does not exist.", cli.MsgType.BAD_INPUT)
-        show_available()
+        _show_names(db_manager.catalog.names())  # from the catalog, without looking at the vault
         return None
 
     cli.cout(f"\nSwitched to {new_sheet} sheet.", cli.MsgType.SUCCESS)
@@ -38,12 +40,46 @@ def select_sheet(new_sheet: str) -> str:
 
 # > sheets
 def show_available():
-    sheets = db_manager.list_databases()
+    sheets = db_manager.list_sheets()
 
     if not sheets:
         cli.cout(f"\nNo sheets found in {db_manager.vault_path}")
         return
 
     cli.cout("\nAvailable sheets:")
-    for sheet in sheets:
-        cli.cout(f"    - {sheet.stem}")
+    width = max(len(name) for name in sheets)
+    cli.cout_records((_record(name, entry) for name, entry in sheets.items()), lambda sheet: _line(sheet, width))
+
+
+def _show_names(names: list):
+    if names:
+        cli.cout("\nAvailable sheets:")
+        cli.cout_lines(f"    - {name}" for name in names)
+
+
+def _record(name: str, entry: dict) -> dict:
+    return {
+        "sheet": name,
+        "commands": entry["commands"],
+        "tags": entry["tags"],
+        "size": entry["size"],
+        "modified": time.strftime("%Y-%m-%d %H:%M", time.localtime(entry["modified"])),
+    }
+
+
+def _line(sheet: dict, width: int) -> str:
+    if sheet["commands"] is None:  # could not be read
+        return f"    - {sheet['sheet']:<{width}}  (not a sheet)"
+
+    return (
+        f"    - {sheet['sheet']:<{width}}  {sheet['commands']:>8} commands {sheet['tags']:>7} tags "
+        f"{_size(sheet['size']):>9}  {sheet['modified']}"
+    )
+
+
+def _size(size: int) -> str:
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
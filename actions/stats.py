@@ -0,0 +1,85 @@
+from utils.db_manager import db_manager
+from utils.stats import stats
+
+from ui import prettier_cli as cli
+
+
+# queries listed by `stats`, slowest in total first
+TOP_QUERIES = 10
+
+
+# > stats [on | off | reset | slow]
+def show_stats(args: str = None):
+    option = (args or "").strip()
+
+    if option in ("on", "off"):
+        stats.enabled = option == "on"
+        db_manager.close()  # next query reconnects, traced or not
+        cli.cout(f"Stats {option}.", cli.MsgType.SUCCESS)
+        return
+
+    if option == "reset":
+        stats.reset()
+        cli.cout("Stats reset.", cli.MsgType.SUCCESS)
+        return
+
+    if option == "slow":
+        _slow_queries()
+        return
+
+    if option:
+        cli.cout("Error: use stats, stats on, stats off, stats reset or stats slow.", cli.MsgType.BAD_INPUT)
+        return
+
+    if not stats.enabled:
+        cli.cout("Stats are off. Turn them on with 'stats on' or STATS ON in the settings file.", cli.MsgType.WARNING)
+
+    if not stats.operations:
+        cli.cout("\nNo queries recorded yet.")
+        return
+
+    cli.cout("\nOperations               count    p50 ms    p90 ms    p99 ms    max ms")
+    cli.cout_records(
+        (_record("operation", name, timings) for name, timings in sorted(stats.operations.items())),
+        _line,
+    )
+
+    queries = sorted(stats.queries.items(), key=lambda query: sum(query[1].samples), reverse=True)
+    cli.cout(f"\nQueries (top {TOP_QUERIES} by total time), rows returned")
+    cli.cout_records(
+        (_record("query", sql, timings) for sql, timings in queries[:TOP_QUERIES]),
+        lambda record: f"{record['name'][:120]}\n    {'':<22} {_timings(record)}  {record['rows']} rows",
+    )
+
+    if stats.connections.count:
+        cli.cout("\nConnections opened")
+        cli.cout_records([_record("connect", "connect", stats.connections)], _line)
+
+
+def _slow_queries():
+    if not stats.slow:
+        threshold = f"{stats.slow_ms} ms" if stats.slow_ms else "off (SLOW_QUERY_MS 0)"
+        cli.cout(f"\nNo slow queries (threshold {threshold}).")
+        return
+
+    if stats.log_path:
+        cli.cout(f"\nSlow queries are also logged to {stats.log_path}")
+
+    for entry in stats.slow:
+        cli.cout(f"\n{entry['time']}  {entry['ms']} ms  {entry['rows']} rows", fore=cli.Colors.ORANGE)
+        cli.cout_lines([entry["sql"], f"params: {entry['params']}"] + [f"  {step}" for step in entry["plan"]])
+
+
+def _record(kind: str, name: str, timings) -> dict:
+    return {"kind": kind, "name": name, "count": timings.count, "rows": timings.rows, **timings.percentiles()}
+
+
+def _line(record: dict) -> str:
+    return f"{record['name'][:22]:<22} {_timings(record)}"
+
+
+def _timings(record: dict) -> str:
+    return (
+        f"{record['count']:>7} {record['p50_ms']:>9.3f} {record['p90_ms']:>9.3f} "
+        f"{record['p99_ms']:>9.3f} {record['max_ms']:>9.3f}"
+    )
@@ -0,0 +1,142 @@
+import csv
+import json
+import time
+
+from os.path import expanduser, expandvars
+from pathlib import Path
+
+from utils.db_manager import db_manager, requires_db
+from utils.parsing import is_word
+from ui import prettier_cli as cli
+
+
+FORMATS = (".jsonl", ".csv")
+CSV_FIELDS = ["id", "tool", "args", "desc", "tags"]
+
+
+# > import <file>
+@requires_db
+def import_commands(file: str):
+    path = _file_path(file)
+    if not path:
+        return
+
+    if not path.is_file():
+        cli.cout(f"Error: file '{path}' does not exist.", cli.MsgType.BAD_INPUT)
+        return
+
+    skipped = []
+    start = time.perf_counter()
+
+    with path.open(newline="", encoding="utf-8") as f:
+        reader = _read_jsonl(f) if path.suffix == ".jsonl" else _read_csv(f)
+        result = db_manager.import_commands(_valid_records(reader, skipped))
+
+    elapsed = time.perf_counter() - start
+    count = result["inserted"] + result["merged"]
+    cli.cout(
+        f"\nImported {result['inserted']} commands in {elapsed:.2f}s ({count / elapsed:.0f} records/s).",
+        cli.MsgType.SUCCESS,
+    )
+
+    if result["merged"]:
+        cli.cout(f"Merged the tags of {result['merged']} duplicate commands.", cli.MsgType.WARNING)
+
+    if skipped:
+        lines = ", ".join(str(line) for line in skipped[:10])
+        cli.cout(f"Skipped {len(skipped)} invalid records (lines {lines}...).", cli.MsgType.WARNING)
+
+
+# > export <file>
+@requires_db
+def export_commands(file: str):
+    path = _file_path(file)
+    if not path:
+        return
+
+    if path.exists():
+        cli.cout(f"Error: file '{path}' already exists.", cli.MsgType.BAD_INPUT)
+        return
+
+    count = 0
+    start = time.perf_counter()
+
+    with path.open("w", newline="", encoding="utf-8") as f:
+        if path.suffix == ".jsonl":
+            for command in db_manager.export_commands():
+                f.write(json.dumps(command) + "\n")
+                count += 1
+        else:
+            writer = csv.writer(f)
+            writer.writerow(CSV_FIELDS)
+            for command in db_manager.export_commands():
+                command["tags"] = " ".join(command["tags"])
+                writer.writerow(command[field] for field in CSV_FIELDS)
+                count += 1
+
+    elapsed = time.perf_counter() - start
+    cli.cout(
+        f"\nExported {count} commands in {elapsed:.2f}s ({count / elapsed:.0f} commands/s).",
+        cli.MsgType.SUCCESS,
+    )
+
+
+def _file_path(file: str) -> Path:
+    if not file or len(file.split()) != 1:
+        cli.cout("Error: specify 1 file.", cli.MsgType.BAD_INPUT)
+        return None
+
+    path = Path(expanduser(expandvars(file)))
+
+    if path.suffix not in FORMATS:
+        cli.cout(f"Error: file must be one of {', '.join(FORMATS)}.", cli.MsgType.BAD_INPUT)
+        return None
+
+    return path
+
+
+# yields (line number, record) pairs, record is None if line is not valid json
+def _read_jsonl(f):
+    for line_num, line in enumerate(f, 1):
+        if not line.strip():
+            continue
+        try:
+            yield line_num, json.loads(line)
+        except json.JSONDecodeError:
+            yield line_num, None
+
+
+def _read_csv(f):
+    reader = csv.DictReader(f)
+    for record in reader:
+        record["tags"] = (record.get("tags") or "").split()
+        yield reader.line_num, record
+
+
+# normalises records to the shape expected by db_manager.import_commands
+def _valid_records(reader, skipped: list):
+    for line_num, record in reader:
+        if not isinstance(record, dict):
+            skipped.append(line_num)
+            continue
+
+        tool = record.get("tool")
+        tags = record.get("tags") or []
+        texts = (record.get("args"), record.get("desc"))
+
+        if not is_word(tool) or not isinstance(tags, list) or not all(map(is_word, tags)):
+            skipped.append(line_num)
+            continue
+
+        if not all(text is None or isinstance(text, str) for text in texts):
+            skipped.append(line_num)
+            continue
+
+        tool = tool.strip()
+
+        yield {
+            "tool": tool,
+            "args": record.get("args") or "",
+            "desc": record.get("desc") or "",
+            "tags": list(dict.fromkeys([tag.strip() for tag in tags] + [tool])),
+        }
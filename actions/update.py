@@ -1,9 +1,11 @@
 from utils.db_manager import db_manager, requires_db
+from utils.parsing import parse_query
 from utils.settings_manager import settings
 from ui import prettier_cli as cli
 from actions import select, help
 
 
+# > edit <id> [tool] [args] [desc] [tags]
 @requires_db
 def edit_command(args: str):
     def edit_base_attributes():
@@ -44,37 +46,132 @@ def edit_command(args: str):
     # else tags = None and special case won't trigger
     tags = None if "tags" not in attrs else attrs.pop(attrs.index("tags"))
 
+    # changes are staged here and applied in one transaction once confirmed
     updates = {}
+    current = [row["tag"] for row in db_manager.get_tags_from_command(id)]
+    staged = list(current)
 
     edit_base_attributes()
 
     if tags:
-        _edit_tags(id, settings.active_sheet)
+        staged = _edit_tags(id, settings.active_sheet, staged)
 
-    if updates:
-        db_manager.update_command(updates, id)
+    added = [tag for tag in staged if tag not in current]
+    removed = [tag for tag in current if tag not in staged]
+
+    if not (updates or added or removed):
+        cli.cout("\nNothing to change.")
+        return
+
+    _print_diff(command, updates, added, removed)
+
+    # same tool and args as another command: it can only be merged into it
+    duplicate = None
+    if "tool" in updates or "args" in updates:
+        duplicate = db_manager.find_duplicate(updates.get("tool", command["tool"]), updates.get("args", command["args"]))
+        duplicate = None if duplicate == int(id) else duplicate
+
+    if duplicate is not None:
+        cli.cout(f"\nThe edited command is the same as {duplicate}.", cli.MsgType.WARNING)
+        merged = "tags and desc" if "desc" in updates else "tags"
+        prompt = f"\n{settings.active_sheet} / edit / {id} / merge its {merged} into {duplicate} and delete {id}? (y/n)"
+    else:
+        prompt = f"\n{settings.active_sheet} / edit / {id} / apply? (y/n)"
+
+    answer = cli.cin(prompt, fore=cli.Colors.ORANGE)
+    if (answer or "").strip().lower() not in ("y", "yes"):
+        cli.cout("Changes discarded.", cli.MsgType.WARNING)
+        return
+
+    if duplicate is not None:
+        db_manager.merge_command(int(id), duplicate, staged, updates.get("desc"))
+        cli.cout(f"Merged {id} into {duplicate}.", cli.MsgType.SUCCESS)
+        select.list_commands(id=str(duplicate))
+        return
+
+    db_manager.edit_command(int(id), updates, added, removed)
+    cli.cout("Changes applied.", cli.MsgType.SUCCESS)
 
     select.list_commands(id=str(id))
 
 
-def _edit_tags(id: int, sheet: str):
+# edits a copy of the tags of the command, nothing is written until confirmed
+def _edit_tags(id: int, sheet: str, staged: list) -> list:
     while True:
         prompt = f"\n{sheet} / edit / {id} / tags (h for help)"
-        action, *tags = cli.cin(prompt, fore=cli.Colors.ORANGE, split=1)
+        action, tags = cli.cin(prompt, fore=cli.Colors.ORANGE, split=1)
+        tags = (tags or "").split()
+
         if action == "h":
             help.edit_tags_help()
 
         elif action == "rm":
-            db_manager.delete_tag_from_command(id, tags)
+            staged = [tag for tag in staged if tag not in tags]
 
         elif action == "add":
-            db_manager.add_tags_to_commands(id, tags)
+            staged += [tag for tag in dict.fromkeys(tags) if tag not in staged]
 
         elif action == "ls":
-            select.list_tags_from_cmd(id)
+            cli.cout("\nTags (staged):")
+            cli.cout_records(({"tag": tag} for tag in staged), select._tag_line)
 
         elif not action:
-            break
+            return staged
 
         else:
             cli.cout("Error: specify add/rm followed by tag(s)")
+
+
+def _print_diff(command: dict, updates: dict, added: list, removed: list):
+    cli.cout("\nChanges:")
+    lines = [f"    {attr}: {command[attr]} -> {value}" for attr, value in updates.items()]
+    lines += [f"    + #{tag}" for tag in added]
+    lines += [f"    - #{tag}" for tag in removed]
+    cli.cout_lines(lines)
+
+
+# > retag <ids> tool:<tool> tag:<tag> +<tag> -<tag>
+# > retag --rename <old> <new>
+@requires_db
+def retag_commands(args: str):
+    words = (args or "").split()
+
+    if words[:1] == ["--rename"]:
+        _rename_tag(words[1:])
+        return
+
+    # no selection starts with + or -, so every +<tag> and -<tag> is a tag edit
+    edits = [word for word in words if word.startswith(("+", "-")) and len(word) > 1]
+    add = [word[1:] for word in edits if word[0] == "+"]
+    remove = [word[1:] for word in edits if word[0] == "-"]
+    selection = [word for word in words if word not in edits]
+
+    if not add and not remove:
+        cli.cout("Error: specify tags to add (+<tag>) or remove (-<tag>).", cli.MsgType.BAD_INPUT)
+        return
+
+    query = parse_query(" ".join(selection))
+    if not query:
+        return
+
+    if not any(query):
+        cli.cout("Error: specify the ids, tool:<tool> or tag:<tag> to retag.", cli.MsgType.BAD_INPUT)
+        return
+
+    changes = db_manager.retag(*query, add=add, remove=remove)
+    cli.cout(f"Added {changes['tags_added']} and removed {changes['tags_removed']} tags.", cli.MsgType.SUCCESS)
+
+
+def _rename_tag(names: list):
+    if len(names) != 2:
+        cli.cout("Error: use retag --rename <old> <new>.", cli.MsgType.BAD_INPUT)
+        return
+
+    old, new = names
+    count = db_manager.rename_tag(old, new)
+
+    if count < 0:
+        cli.cout(f"Error: no tag '{old}'.", cli.MsgType.BAD_INPUT)
+        return
+
+    cli.cout(f"Renamed '{old}' to '{new}' on {count} commands.", cli.MsgType.SUCCESS)
@@ -0,0 +1,114 @@
+"""Index usage of the tool, tag and listing queries
+
+Generates a sheet (see vault.py), runs the DatabaseManager queries behind
+`tool`, `tag`, `ls --page`, `ls --after` and `ls <id>` with a trace on the
+connection and checks the EXPLAIN QUERY PLAN of every statement they ran.
+
+Fails when a plan scans commands, tags or command_tags without an index, or
+sorts in a temporary b-tree. Tag queries group and order the commands they
+matched, so they are allowed the GROUP BY and ORDER BY b-trees over those
+rows (never a scan).
+
+Usage: python benchmarks/query_plans.py [--commands 20000] [--vault DIR]
+"""
+
+import argparse
+import re
+import sys
+import tempfile
+
+from pathlib import Path
+
+import vault as synthetic
+
+# tables (and the aliases the queries give them) that must never be scanned without an index
+TABLES = {"commands", "c", "tags", "t", "command_tags", "ct"}
+
+# temporary b-trees allowed by query
+ALLOWED_SORTS = {
+    "tag": {"USE TEMP B-TREE FOR GROUP BY", "USE TEMP B-TREE FOR ORDER BY"},
+}
+
+
+def traced(db_manager, run) -> list:
+    """Statements run by run(), with their bound values, except the pragmas"""
+    statements = []
+
+    db_manager.query_cache.clear()
+    with db_manager.session() as conn:
+        conn.set_trace_callback(statements.append)
+        try:
+            for _ in run() or ():
+                pass
+        finally:
+            conn.set_trace_callback(None)
+
+    return [sql for sql in statements if re.match(r"\s*(select|with)\b", sql, re.IGNORECASE)]
+
+
+def problems(conn, sql: str, allowed: set) -> list:
+    """Steps of the plan of sql that scan a table or sort outside allowed"""
+    found = []
+
+    for *_, detail in conn.execute(f"EXPLAIN QUERY PLAN {sql}"):
+        scan = re.match(r"SCAN (\w+)", detail)
+        if scan and scan.group(1) in TABLES and "USING" not in detail:
+            found.append(detail)
+        elif detail.startswith("USE TEMP B-TREE") and detail not in allowed:
+            found.append(detail)
+
+    return found
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Check the query plans of the sheet queries.")
+    parser.add_argument("--commands", type=int, default=20_000)
+    parser.add_argument("--vault", type=Path, default=None)
+    args = parser.parse_args()
+
+    vault = (args.vault or Path(tempfile.mkdtemp(prefix="cheetah-plans-"))).resolve()
+    synthetic.generate(vault, {"plans": args.commands}, distribution="zipf")
+
+    db_manager = synthetic.open_vault(vault)
+
+    from utils.settings_manager import settings
+
+    settings.snapshot = "OFF"  # plans of the SQLite queries, not of the snapshot
+    db_manager.change_database("plans")
+
+    tools = [row["tool"] for row in db_manager.get_tools()]
+    tags = [row["tag"] for row in db_manager.get_tags()]
+    middle = len(tools) // 2
+
+    cases = {
+        "tool": lambda: db_manager.get_commands_by_tool(tools[middle]),
+        "tag": lambda: db_manager.get_commands_by_tags([tags[middle]]),
+        "tag +required -excluded": lambda: db_manager.get_commands_by_tags(tags[:2], [tags[2]], [tags[3]]),
+        "ls --page 1": lambda: db_manager.get_commands(limit=int(settings.page_size)),
+        "ls --page 10": lambda: db_manager.get_commands(offset=9 * int(settings.page_size), limit=int(settings.page_size)),
+        "ls --after <id>": lambda: db_manager.get_commands(after=args.commands // 2, limit=int(settings.page_size)),
+        "ls <id>": lambda: [db_manager.get_command_by_id(args.commands // 2)],
+    }
+
+    failed = 0
+    with db_manager.session() as conn:
+        for name, run in cases.items():
+            allowed = ALLOWED_SORTS.get(name.split()[0], set())
+            statements = traced(db_manager, run)
+            found = [(sql, problems(conn, sql, allowed)) for sql in statements]
+            bad = [(sql, details) for sql, details in found if details]
+
+            print(f"{'FAIL' if bad else 'ok':<5} {name} ({len(statements)} statements)")
+            for sql, details in bad:
+                print(f"      {' '.join(sql.split())[:100]}")
+                for detail in details:
+                    print(f"          {detail}")
+            failed += bool(bad)
+
+    db_manager.close()
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
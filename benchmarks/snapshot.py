@@ -0,0 +1,117 @@
+"""Memory and latency of the in-memory sheet snapshot (SNAPSHOT ON)
+
+Generates a sheet (see vault.py), loads it as a Snapshot and reports the
+memory it takes per command (tracemalloc), next to the same commands held
+as sqlite3.Row and as dicts. Then times tool, tag, id and page queries
+answered from SQLite and from the snapshot, with the query cache cleared
+before every run so each run does the work.
+
+Usage: python benchmarks/snapshot.py [--commands 100000] [--runs 200] [--vault DIR]
+"""
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+from pathlib import Path
+
+import vault as synthetic
+
+
+def allocated(build) -> tuple:
+    """Bytes allocated by build() that are still alive, with its result"""
+    tracemalloc.start()
+    result = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return size, result
+
+
+def median_ms(run, runs: int, setup) -> float:
+    times = []
+    for _ in range(runs):
+        setup()
+        start = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - start)
+    return statistics.median(times) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure the sheet snapshot.")
+    parser.add_argument("--commands", type=int, default=100_000)
+    parser.add_argument("--runs", type=int, default=200)
+    parser.add_argument("--vault", type=Path, default=None)
+    args = parser.parse_args()
+
+    vault = (args.vault or Path(tempfile.mkdtemp(prefix="cheetah-snapshot-"))).resolve()
+    synthetic.generate(vault, {"bench": args.commands})
+
+    db_manager = synthetic.open_vault(vault)
+
+    from utils.settings_manager import settings
+    from utils.snapshot import Snapshot
+
+    db_manager.change_database("bench")
+
+    with db_manager.session() as conn:
+        select = "select id, tool, args, desc from commands"
+        rows_size, rows = allocated(lambda: conn.execute(select).fetchall())
+        dicts_size, dicts = allocated(lambda: [dict(row) for row in rows])  # share the strings of rows
+        del rows, dicts
+
+        conn.execute("BEGIN")
+        start = time.perf_counter()
+        Snapshot(conn)
+        load = time.perf_counter() - start
+        snapshot_size, snapshot = allocated(lambda: Snapshot(conn))
+        conn.rollback()
+
+    count = len(snapshot)
+    text = sum(sys.getsizeof(args) + sys.getsizeof(desc) for args, desc in zip(snapshot.args, snapshot.descs))
+    postings = sum(len(postings) for postings in snapshot.by_tag.values())
+
+    print(f"{count} commands, {len(snapshot.tool_names)} tools, {len(snapshot.by_tag)} tags, {postings} tag links")
+    print(f"load: {load * 1000:.0f} ms, args and desc strings: {text / count:.0f} bytes/command\n")
+    print(f"{'':>12}  {'bytes/command':>13}  {'without args/desc':>17}")
+    for name, size in (
+        ("sqlite3.Row", rows_size),  # no tags
+        ("dict", dicts_size + text),  # no tags
+        ("snapshot", snapshot_size),  # with tag postings
+    ):
+        print(f"{name:>12}  {size / count:>13.0f}  {(size - text) / count:>17.0f}")
+
+    rnd = random.Random(0)
+    tags = sorted(snapshot.by_tag, key=lambda tag: -len(snapshot.by_tag[tag]))
+    tool = snapshot.tool_names[snapshot.tools[0]]
+    common, rare = tags[5], tags[len(tags) // 2]
+    ids = [snapshot.ids[rnd.randrange(count)] for _ in range(args.runs)]
+    after = snapshot.ids[count // 2]
+
+    cases = {
+        f"tool {tool}": lambda: db_manager.get_commands_by_tool(tool),
+        f"tag {rare}": lambda: db_manager.get_commands_by_tags([rare]),
+        f"tag {common} +{tags[0]}": lambda: db_manager.get_commands_by_tags([common], [tags[0]]),
+        f"tag {tags[0]} {tags[1]} -{tags[2]}": lambda: db_manager.get_commands_by_tags(tags[:2], [], [tags[2]]),
+        "ls <id>": lambda: db_manager.get_command_by_id(rnd.choice(ids)),
+        "ls --after <id>": lambda: list(db_manager.get_commands(after=after, limit=int(settings.page_size))),
+    }
+
+    print(f"\n{'query (median)':<32} {'sqlite ms':>10} {'snapshot ms':>12}")
+    for name, run in cases.items():
+        settings.snapshot = "OFF"
+        sqlite_ms = median_ms(run, args.runs, db_manager.query_cache.clear)
+        settings.snapshot = "ON"
+        db_manager.snapshot = snapshot
+        snapshot_ms = median_ms(run, args.runs, db_manager.query_cache.clear)
+        print(f"{name:<32} {sqlite_ms:>10.3f} {snapshot_ms:>12.3f}")
+
+    db_manager.close()
+
+
+if __name__ == "__main__":
+    main()
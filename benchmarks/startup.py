@@ -0,0 +1,128 @@
+"""Cold-start budget of cheetah.py
+
+Imports cheetah.py in fresh interpreters with `python -X importtime` and
+fails if the median cumulative import time goes over BUDGET_MS, or if any
+module in DEFERRED is imported at startup (they must load on first use).
+
+Also times one-shot queries (`cheetah.py <sheet> tag ... --format tsv`) end
+to end, process spawn included, against ONE_SHOT_BUDGET_MS. One-shot runs
+must not import rich either.
+
+Usage: python benchmarks/startup.py [runs]
+"""
+
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+from pathlib import Path
+
+# median cumulative import time of cheetah.py, in milliseconds
+BUDGET_MS = 60
+
+# heavy dependencies only some commands need
+DEFERRED = ["rich", "prompt_toolkit", "pyperclip", "concurrent.futures"]
+
+# median wall time of a one-shot query, interpreter start included, in milliseconds
+ONE_SHOT_BUDGET_MS = 120
+
+ONE_SHOT_QUERY = ["bench", "tag", "reverse", "--format", "tsv"]
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def import_times(home: str) -> dict:
+    """Import cheetah.py in a fresh interpreter
+
+    Args:
+        home: HOME directory holding the settings file
+
+    Returns:
+        dict: cumulative import time in microseconds by module
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import cheetah"],
+        cwd=ROOT,
+        env={**os.environ, "HOME": home},
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.split("|")
+        times[module.strip()] = int(cumulative)
+
+    return times
+
+
+def one_shot(home: str, *args: str, input: str = None, importtime: bool = False) -> tuple:
+    """Run cheetah.py once, non-interactively
+
+    Args:
+        home: HOME directory holding the settings file
+        args: one-shot arguments (sheet, command, ...)
+        input: text written to stdin
+        importtime: run under -X importtime
+
+    Returns:
+        tuple: wall time in milliseconds and the completed process
+    """
+    flags = ["-X", "importtime"] if importtime else []
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, *flags, "cheetah.py", *args],
+        cwd=ROOT,
+        env={**os.environ, "HOME": home},
+        input=input,
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    return (time.perf_counter() - start) * 1000, result
+
+
+def main(runs: int = 10) -> int:
+    with tempfile.TemporaryDirectory() as home:
+        settings = Path(home) / ".config" / "cheetah" / "settings"
+        settings.parent.mkdir(parents=True)
+        settings.write_text(f"VAULT {home}")
+
+        samples = [import_times(home) for _ in range(runs)]
+
+        one_shot(home, "-", "create", "bench")
+        one_shot(home, "bench", "add", input="apktool\nd app.apk\ndecode an apk\nreverse\n\n")
+        one_shot_ms = statistics.median(one_shot(home, *ONE_SHOT_QUERY)[0] for _ in range(runs))
+        _, traced = one_shot(home, *ONE_SHOT_QUERY, importtime=True)
+
+    median_ms = statistics.median(sample["cheetah"] for sample in samples) / 1000
+    deferred = [module for module in DEFERRED if module in samples[0]]
+    styled = any(line.split("|")[-1].strip() == "rich" for line in traced.stderr.splitlines())
+
+    print(f"cheetah.py import: {median_ms:.1f} ms (median of {runs}, budget {BUDGET_MS} ms)")
+    print(f"one-shot query: {one_shot_ms:.1f} ms (median of {runs}, budget {ONE_SHOT_BUDGET_MS} ms)")
+
+    if deferred:
+        print(f"Imported at startup but should be deferred: {', '.join(deferred)}")
+
+    if styled:
+        print("One-shot query imported rich")
+
+    if median_ms > BUDGET_MS:
+        slowest = sorted(samples[0].items(), key=lambda item: item[1], reverse=True)[1:11]
+        print("Slowest imports:")
+        for module, cumulative in slowest:
+            print(f"    {cumulative / 1000:7.1f} ms  {module}")
+
+    over_budget = median_ms > BUDGET_MS or one_shot_ms > ONE_SHOT_BUDGET_MS
+    return 1 if deferred or styled or over_budget else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main(*map(int, sys.argv[1:])))
@@ -0,0 +1,411 @@
+"""Benchmark suite of DatabaseManager and the select rendering paths
+
+Generates a vault per size (see vault.py), times every public
+DatabaseManager method and the select rendering paths on it, and writes
+the results to a JSON file. With --compare, results are checked against a
+baseline written by a previous run, and cases slower than the baseline by
+more than --threshold are reported as regressions (exit code 1).
+
+Every case is timed in --rounds rounds over the whole list, so a burst of
+load on the machine only slows down some rounds of a case. Cases are
+compared by their fastest run, scaled by a calibration workload timed
+along with them, so a machine that is busier (or slower) than the one
+that wrote the baseline does not show up as a regression of every case.
+Cases found slower are timed again and only reported if they stay slower.
+
+Generated vaults are kept in --cache and copied before each run, so the
+writes of a run do not leak into the next one.
+
+Usage: python benchmarks/suite.py [--sizes 1000,100000,1000000] [--output results.json]
+           [--compare baseline.json] [--threshold 0.2] [--rounds 3] [--cache DIR] [--only PATTERN]
+"""
+
+import argparse
+import json
+import os
+import platform
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+from fnmatch import fnmatch
+from pathlib import Path
+
+import vault as synthetic
+
+# per case, runs stop once they add up to MIN_TIME seconds (at least MIN_RUNS, at most MAX_RUNS)
+MIN_TIME = 0.3
+MIN_RUNS = 3
+MAX_RUNS = 50
+
+# cases slower than a single run of SLOW_RUN seconds are run once
+SLOW_RUN = 2.0
+
+# differences below NOISE_MS are never reported as regressions
+NOISE_MS = 0.05
+
+# cases found slower than the baseline are timed again up to CONFIRM_RUNS times
+CONFIRM_RUNS = 2
+
+SEED = 0
+SIDE_SHEETS = 3
+GENERATOR = {"tags": 1000, "tags_per_command": (1, 5), "distribution": "zipf"}
+
+
+def measure(run, setup=None) -> dict:
+    """Time run, calling setup (untimed) before every run
+
+    Args:
+        run: function to time
+        setup: function preparing the state run needs
+
+    Returns:
+        dict: median_ms, min_ms and runs
+    """
+    samples = []
+
+    while len(samples) < MAX_RUNS:
+        if setup:
+            setup()
+        start = time.perf_counter()
+        run()
+        samples.append(time.perf_counter() - start)
+
+        if samples[0] > SLOW_RUN or (len(samples) >= MIN_RUNS and sum(samples) >= MIN_TIME):
+            break
+
+    return {
+        "median_ms": round(statistics.median(samples) * 1000, 4),
+        "min_ms": round(min(samples) * 1000, 4),
+        "runs": len(samples),
+    }
+
+
+# fixed python and sqlite workload, compare scales results by its time
+def calibrate():
+    conn = sqlite3.connect(":memory:")
+    conn.execute("create table t (id integer primary key, name text)")
+    conn.executemany("insert into t (name) values (?)", ((f"name{i}",) for i in range(20_000)))
+    sorted(conn.execute("select name from t where name like 'name1%'").fetchall(), reverse=True)
+    conn.close()
+
+
+def consume(iterable):
+    for _ in iterable:
+        pass
+
+
+def cases(db, select, cli, size: int) -> dict:
+    """Build the cases for a vault of size commands, bench sheet selected
+
+    Returns:
+        dict: (run, setup) by case name
+    """
+    conn = db.connection
+    top_tool = conn.execute(
+        "select tool from commands group by tool order by count(*) desc limit 1"
+    ).fetchone()[0]
+    top_tags = [row[0] for row in conn.execute(
+        """
+        select t.tag from tags t join command_tags ct on ct.tag_id = t.id
+        group by t.id order by count(*) desc limit 3
+        """
+    )]
+    rare_tag = conn.execute("select tag from tags order by id desc limit 1").fetchone()[0]
+    renamed = [conn.execute("select tag from tags order by id desc limit 1 offset 1").fetchone()[0]]
+    max_id = conn.execute("select max(id) from commands").fetchone()[0]
+    middle_id = max_id // 2
+    middle = conn.execute("select tool, args from commands where id = ?", (middle_id,)).fetchone()
+
+    new_records = list(synthetic.records(1000, seed=SEED + 100, **GENERATOR))
+    deletable = iter(range(max_id, 0, -1))
+    mergeable = iter(range(1, middle_id))
+    created = iter(range(1_000_000))
+    runs = iter(range(1_000_000))  # writes of each run must not duplicate earlier commands
+
+    def new_batch():
+        run = next(runs)
+        return ({**record, "args": f"{record['args']} -r {run}"} for record in new_records)
+
+    commands = list(db.get_commands(limit=min(size, 10_000)))
+    tagged = db.get_commands_by_tags(top_tags[:2])[0][:10_000]
+    matches = db.search(["scan"], limit=10_000)
+
+    cold = db.query_cache.clear
+
+    def drop_indexes():
+        db.query_cache.clear()
+        db._drop_indexes()
+
+    def rename_tag():  # renamed again on every run, never a tag the reads use
+        name = f"renamed{next(runs)}"
+        db.rename_tag(renamed[-1], name)
+        renamed.append(name)
+
+    def add_duplicates():  # copies of 100 commands without a hash, as left by the migration adding it
+        with db.session() as conn:
+            with conn:
+                conn.execute(
+                    "insert into commands (tool, args, desc) select tool, args, desc from commands where id between ? and ?",
+                    (middle_id, middle_id + 99),
+                )
+
+    def query(conn):
+        return conn.execute("select id, tool, args, desc from commands where id = ?", (middle_id,)).fetchone()
+
+    def query_reused_connection():
+        with db.session() as conn:
+            query(conn)
+
+    def query_new_connection():
+        conn = sqlite3.connect(db.database_path)  # what every session did before connections were kept
+        db._apply_pragmas(conn)
+        query(conn)
+        conn.close()
+
+    def render_tsv():
+        cli.set_format("tsv")
+        select._print_cmds(commands)
+        cli.set_format("human")
+
+    # reads first, writes and new sheets would change what later cases see
+    return {
+        "calibration": (calibrate, None),
+        # reads, cold runs start with an empty query cache
+        # connections, a point query on the kept connection and on one opened for it
+        "session reused connection": (query_reused_connection, None),
+        "session new connection": (query_new_connection, None),
+        "get_commands all": (lambda: consume(db.get_commands()), None),
+        "get_commands page 2": (lambda: list(db.get_commands(offset=50, limit=50)), None),
+        "get_commands after middle": (lambda: list(db.get_commands(after=middle_id, limit=50)), None),
+        "get_command_by_id": (lambda: db.get_command_by_id(middle_id), cold),
+        "get_command_by_id cached": (lambda: db.get_command_by_id(middle_id), None),
+        "get_commands_by_ids 100": (lambda: db.get_commands_by_ids(range(middle_id, middle_id + 100)), cold),
+        "get_commands_by_tool": (lambda: db.get_commands_by_tool(top_tool), cold),
+        "get_commands_by_tags or": (lambda: db.get_commands_by_tags(top_tags[:2]), cold),
+        "get_commands_by_tags rare": (lambda: db.get_commands_by_tags([rare_tag]), cold),
+        "get_commands_by_tags and-not": (
+            lambda: db.get_commands_by_tags([], top_tags[:2], top_tags[2:]),
+            cold,
+        ),
+        "get_tags": (db.get_tags, cold),
+        "get_tags cached": (db.get_tags, None),
+        "get_tools": (db.get_tools, cold),
+        "get_tags_from_command": (lambda: db.get_tags_from_command(middle_id), cold),
+        "find_duplicate": (lambda: db.find_duplicate(middle["tool"], middle["args"]), None),
+        "search": (lambda: db.search(["scan"]), None),
+        "search prefix": (lambda: db.search(["enu*", "dump"]), None),
+        "suggest_tags build": (lambda: db.suggest_tags("revrse"), drop_indexes),
+        "suggest_tags": (lambda: db.suggest_tags("revrse"), None),
+        "suggest_tools": (lambda: db.suggest_tools("nmpa"), None),
+        "complete tag build": (lambda: db.complete("tag", "re"), drop_indexes),
+        "complete tag": (lambda: db.complete("tag", "re"), None),
+        "complete id": (lambda: db.complete("id", "12"), None),
+        "complete sheet": (lambda: db.complete("sheet", "be"), None),
+        # vault
+        "get_commands_by_tool_in_vault": (lambda: db.get_commands_by_tool_in_vault(top_tool), None),
+        "get_commands_by_tags_in_vault": (lambda: db.get_commands_by_tags_in_vault(top_tags[:2]), None),
+        "search_vault": (lambda: db.search_vault(["scan"]), None),
+        # rendering (up to 10k rows, into a terminal console writing to /dev/null)
+        "render commands": (lambda: select._print_cmds(commands), None),
+        "render tagged": (lambda: select._print_tagged(tagged), None),
+        "render matches": (lambda: select._print_matches(matches), None),
+        "render list_tags": (select.list_tags, None),
+        "render commands tsv": (render_tsv, None),
+        # writes
+        "add_command": (lambda: db.add_command("nmap", f"-sV host{next(runs)}", "scan services", ["scan", "recon"]), None),
+        "add_tags_to_commands": (lambda: db.add_tags_to_commands(middle_id, ["bench-tag"]), None),
+        "delete_tag_from_command": (
+            lambda: db.delete_tag_from_command(middle_id, ["bench-tag"]),
+            lambda: db.add_tags_to_commands(middle_id, ["bench-tag"]),
+        ),
+        "update_command": (lambda: db.update_command({"desc": "updated"}, middle_id), None),
+        "edit_command": (
+            lambda: db.edit_command(middle_id, {"desc": "edited"}, ["bench-edit"]),
+            lambda: db.edit_command(middle_id, {}, remove_tags=["bench-edit"]),
+        ),
+        "retag tool": (
+            lambda: db.retag(tools=[top_tool], add=["bench-retag"]),
+            lambda: db.retag(tools=[top_tool], remove=["bench-retag"]),
+        ),
+        "rename_tag": (rename_tag, None),
+        "merge_command": (lambda: db.merge_command(next(mergeable), middle_id, ["bench-merge"]), None),
+        "dedupe 100": (db.dedupe, add_duplicates),
+        "delete_command": (lambda: db.delete_command([(next(deletable),) * 2]), None),
+        "import_commands 1k": (lambda: db.import_commands(new_batch()), None),
+        "export_commands": (lambda: consume(db.export_commands()), None),
+        "maintain light": (lambda: db.maintain(full=False), None),
+        "maintain": (db.maintain, None),
+        # sheets
+        "change_database": (lambda: db.change_database("bench"), None),
+        "create": (lambda: db.create(f"created{next(created)}"), None),
+        "list_databases": (db.list_databases, None),
+        "is_on": (db.is_on, None),
+        "close": (db.close, lambda: db.change_database("bench")),
+    }
+
+
+def run_size(size: int, cache: Path, selected, rounds: int) -> dict:
+    """Generate (or reuse) the vault of size commands and run every case on a copy,
+    rounds times. Each case keeps its fastest run and the median of its round medians.
+
+    Returns:
+        dict: measures by case name
+    """
+    side = max(size // 100, 100)
+    sheets = {"bench": size, **{f"side{i}": side for i in range(SIDE_SHEETS)}}
+
+    pristine = cache / f"{size}-{SIDE_SHEETS}x{side}-seed{SEED}"
+    if not (pristine / "bench.db").exists():
+        print(f"generating {size} commands in {pristine} ...", file=sys.stderr)
+        synthetic.generate(pristine, sheets, seed=SEED, **GENERATOR)
+
+    work = Path(tempfile.mkdtemp(prefix="cheetah-bench-"))
+    try:
+        for sheet in pristine.glob("*.db"):
+            shutil.copy(sheet, work / sheet.name)
+
+        db = synthetic.open_vault(work)
+        db.change_database("bench")
+
+        from actions import select
+        from ui import prettier_cli as cli
+
+        size_cases = {
+            name: case
+            for name, case in cases(db, select, cli, size).items()
+            if name == "calibration" or selected(name)
+        }
+
+        measures = {name: [] for name in size_cases}
+        for round in range(rounds):
+            for name, (run, setup) in size_cases.items():
+                db.change_database("bench")
+                measures[name].append(measure(run, setup))
+                print(f"{size:>9} {round + 1}/{rounds} {name:<32} {measures[name][-1]['min_ms']:>12.3f} ms", file=sys.stderr)
+
+        results = {
+            name: {
+                "median_ms": statistics.median(m["median_ms"] for m in case_measures),
+                "min_ms": min(m["min_ms"] for m in case_measures),
+                "runs": sum(m["runs"] for m in case_measures),
+            }
+            for name, case_measures in measures.items()
+        }
+
+        db.close()
+    finally:
+        shutil.rmtree(work)
+
+    return results
+
+
+def compare(results: dict, baseline: dict, threshold: float) -> list:
+    """Find cases slower than in baseline, by fastest run
+
+    Args:
+        results: results of this run
+        baseline: results of a previous run
+        threshold: allowed slowdown, 0.2 means 20%
+
+    Returns:
+        list: (size, case, baseline ms, ms) of regressions, ms scaled to the baseline machine
+    """
+    regressions = []
+
+    for size, measures in results["results"].items():
+        if size not in baseline["results"]:
+            continue
+        scale = baseline["results"][size]["calibration"]["min_ms"] / measures["calibration"]["min_ms"]
+
+        for case, measure in measures.items():
+            before = baseline["results"].get(size, {}).get(case)
+            if not before:
+                continue
+            now, was = measure["min_ms"] * scale, before["min_ms"]
+            if now > was * (1 + threshold) and now - was > NOISE_MS:
+                regressions.append((size, case, was, now))
+
+    return regressions
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark DatabaseManager and select rendering.")
+    parser.add_argument("--sizes", default="1000,100000,1000000", help="commands in the bench sheet")
+    parser.add_argument("--output", type=Path, default=Path("results.json"))
+    parser.add_argument("--compare", type=Path, help="baseline results to compare with")
+    parser.add_argument("--threshold", type=float, default=0.2)
+    parser.add_argument("--cache", type=Path, default=Path(tempfile.gettempdir()) / "cheetah-bench-vaults")
+    parser.add_argument("--rounds", type=int, default=3, help="times the whole case list is run")
+    parser.add_argument("--only", help="run only the cases matching this glob")
+    args = parser.parse_args()
+
+    sizes = [int(size) for size in args.sizes.split(",")]
+    cache = args.cache.resolve()
+    baseline = json.loads(args.compare.read_text()) if args.compare else None
+    regressions = []
+
+    # keep rendering out of the terminal, with the escape codes of a real one
+    synthetic.open_vault(cache)
+    from rich.console import Console
+    from ui import prettier_cli as cli
+
+    devnull = open(os.devnull, "w")
+    cli.rich_console = Console(file=devnull, force_terminal=True, width=120)
+    stdout, sys.stdout = sys.stdout, devnull  # machine formats write to stdout
+
+    try:
+        results = {
+            "meta": {
+                "python": platform.python_version(),
+                "sqlite": sqlite3.sqlite_version,
+                "platform": platform.platform(),
+                "seed": SEED,
+                "generator": GENERATOR,
+                "date": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            },
+            "results": {
+                str(size): run_size(size, cache, lambda name: not args.only or fnmatch(name, args.only), args.rounds)
+                for size in sizes
+            },
+        }
+
+        for _ in range(CONFIRM_RUNS if baseline else 0):
+            regressions = compare(results, baseline, args.threshold)
+            if not regressions:
+                break
+
+            print(f"timing {len(regressions)} slower cases again", file=sys.stderr)
+            for size in dict.fromkeys(size for size, *_ in regressions):
+                slower = {case for slower_size, case, *_ in regressions if slower_size == size}
+                again = run_size(int(size), cache, slower.__contains__, args.rounds)
+                for case, measure in again.items():
+                    kept = results["results"][size][case]
+                    kept["min_ms"] = min(kept["min_ms"], measure["min_ms"])
+                    kept["runs"] += measure["runs"]
+
+        if baseline:
+            regressions = compare(results, baseline, args.threshold)
+    finally:
+        sys.stdout = stdout
+
+    args.output.write_text(json.dumps(results, indent=2) + "\n")
+    print(f"results written to {args.output}")
+
+    if not baseline:
+        return 0
+
+    for size, case, was, now in regressions:
+        print(f"REGRESSION {size:>9} {case:<32} {was:10.3f} ms -> {now:10.3f} ms ({now / was:.2f}x)")
+
+    if not regressions:
+        print(f"no regressions over {args.threshold:.0%} against {args.compare}")
+
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
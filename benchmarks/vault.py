@@ -0,0 +1,169 @@
+"""Synthetic vault generator
+
+Builds sheets of random commands through DatabaseManager.import_commands,
+so generated sheets get the schema, migrations and full-text index of real
+ones. The same arguments (and seed) always build the same sheets.
+
+Tools and tags are picked uniformly or with a zipf distribution (a few
+very common tags, a long tail of rare ones), which is closer to real sheets.
+
+Usage: python benchmarks/vault.py <vault> [--sheets N] [--commands N] [--tags N]
+           [--tags-per-command MIN-MAX] [--distribution uniform|zipf] [--seed N]
+"""
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+from itertools import accumulate
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+# words used for tool names, arguments, descriptions and tags
+WORDS = (
+    "scan enum dump hook patch decode build sign proxy fuzz trace crack spray relay "
+    "shell port host user token cert smali apk dex jar class method heap stack frida "
+    "burp nmap sql xss ssrf ldap smb rdp dns http tls jwt cookie session kernel driver "
+    "binary payload exploit reverse android ios linux windows cloud bucket secret wordlist"
+).split()
+
+TOOLS = 200
+ZIPF_EXPONENT = 1.1
+
+
+def open_vault(vault: Path):
+    """Point cheetah at vault, creating a settings file for it if needed
+
+    Args:
+        vault: vault directory
+
+    Returns:
+        DatabaseManager: db_manager working on vault
+    """
+    vault.mkdir(parents=True, exist_ok=True)
+
+    if "utils.settings_manager" not in sys.modules:
+        home = Path(tempfile.mkdtemp(prefix="cheetah-home-"))
+        settings = home / ".config" / "cheetah" / "settings"
+        settings.parent.mkdir(parents=True)
+        settings.write_text(f"VAULT {vault}")
+        os.environ["HOME"] = str(home)
+        sys.path.insert(0, str(ROOT))
+
+    from utils.catalog import Catalog
+    from utils.db_manager import db_manager
+
+    db_manager.close()
+    db_manager.database_path = None
+    db_manager.vault_path = vault
+    db_manager.catalog = Catalog(vault)
+
+    return db_manager
+
+
+def names(count: int) -> list:
+    """Distinct names built from WORDS: scan, enum, ..., scan1, enum1, ..."""
+    return [f"{WORDS[i % len(WORDS)]}{i // len(WORDS) or ''}" for i in range(count)]
+
+
+def records(
+    commands: int,
+    tags: int = 1000,
+    tags_per_command: tuple = (1, 5),
+    distribution: str = "zipf",
+    seed: int = 0,
+):
+    """Generate random commands in the shape of DatabaseManager.import_commands
+
+    Args:
+        commands: number of commands
+        tags: number of distinct tags
+        tags_per_command: (min, max) tags of a command, picked uniformly
+        distribution: how tools and tags are picked, 'uniform' or 'zipf'
+        seed: seed of the random generator
+
+    Yields:
+        dict: command with tool, args, desc and tags (the tool is one of them)
+    """
+    rnd = random.Random(seed)
+    tool_names = names(TOOLS)
+    tag_names = names(tags)
+
+    def weights(count):
+        if distribution == "uniform":
+            return None
+        return list(accumulate(1 / rank**ZIPF_EXPONENT for rank in range(1, count + 1)))
+
+    tool_weights = weights(len(tool_names))
+    tag_weights = weights(len(tag_names))
+
+    for i in range(commands):
+        tool = rnd.choices(tool_names, cum_weights=tool_weights)[0]
+        count = rnd.randint(*tags_per_command)
+        picked = rnd.choices(tag_names, cum_weights=tag_weights, k=count)
+
+        yield {
+            "tool": tool,
+            "args": " ".join(f"-{word[0]} {word}" for word in rnd.sample(WORDS, 3)) + f" -n {i}",  # no duplicates
+            "desc": " ".join(rnd.sample(WORDS, 6)) + f" {i}",
+            "tags": list(dict.fromkeys(picked + [tool])),
+        }
+
+
+def generate(vault: Path, sheets: dict, seed: int = 0, **options) -> float:
+    """Create sheets in vault filled with generated commands. Existing
+    sheets are left as they are.
+
+    Args:
+        vault: vault directory
+        sheets: number of commands by sheet name
+        seed: seed of the first sheet, next sheets use seed + 1, seed + 2, ...
+        options: tags, tags_per_command and distribution (see records)
+
+    Returns:
+        float: seconds taken
+    """
+    db_manager = open_vault(vault)
+    start = time.perf_counter()
+
+    for offset, (sheet, commands) in enumerate(sheets.items()):
+        if db_manager.create(sheet):
+            db_manager.import_commands(records(commands, seed=seed + offset, **options))
+
+    db_manager.close()
+
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build a vault of synthetic sheets.")
+    parser.add_argument("vault", type=Path)
+    parser.add_argument("--sheets", type=int, default=1)
+    parser.add_argument("--commands", type=int, default=10_000, help="commands per sheet")
+    parser.add_argument("--tags", type=int, default=1000, help="distinct tags per sheet")
+    parser.add_argument("--tags-per-command", default="1-5", help="MIN-MAX")
+    parser.add_argument("--distribution", choices=("uniform", "zipf"), default="zipf")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    low, _, high = args.tags_per_command.partition("-")
+    sheets = {f"sheet{i}": args.commands for i in range(args.sheets)}
+
+    elapsed = generate(
+        args.vault.resolve(),
+        sheets,
+        seed=args.seed,
+        tags=args.tags,
+        tags_per_command=(int(low), int(high or low)),
+        distribution=args.distribution,
+    )
+
+    print(f"{args.sheets} sheets of {args.commands} commands in {args.vault} ({elapsed:.1f}s)")
+
+
+if __name__ == "__main__":
+    main()
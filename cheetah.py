@@ -1,4 +1,4 @@
-from actions import help, insert, other, select, sheets, delete, update
+from importlib import import_module
 
 from ui import prettier_cli as cli
 
@@ -6,30 +6,147 @@ from utils.settings_manager import settings
 
 import sys
 
+
+# action modules are imported on first use, so startup only pays for what is run
+def actions(module: str):
+    return import_module(f"actions.{module}")
+
+
 COMMANDS_MAP = {
-    "help": lambda args: help.main_help(),
-    "h": lambda args: help.main_help(),
-    "sheets": lambda args: sheets.show_available(),
-    "create": lambda args: settings.switch_sheets(sheets.create_sheet(args)),
-    "ls": lambda args: select.list_commands(),
-    "tag": lambda args: select.list_commands(tags=args),
-    "tool": lambda args: select.list_commands(tool=args),
-    "tools": lambda args: select.list_tools(),
-    "tags": lambda args: select.list_tags(),
-    "add": lambda args: insert.insert_command(args),
-    "rm": lambda args: delete.delete_command(args),
-    "edit": lambda args: update.edit_command(args),
-    "cp": lambda args: other.copy_to_clipboard(args),
-    "clear": lambda args: other.clear_screen(),
+    "help": lambda args: actions("help").main_help(),
+    "h": lambda args: actions("help").main_help(),
+    "sheets": lambda args: actions("sheets").show_available(),
+    "create": lambda args: settings.switch_sheets(actions("sheets").create_sheet(args)),
+    "ls": lambda args: actions("select").list_commands(page=args),
+    "tag": lambda args: actions("select").list_commands(tags=args),
+    "tool": lambda args: actions("select").list_commands(tool=args),
+    "search": lambda args: actions("select").search_commands(args),
+    "tools": lambda args: actions("select").list_tools(),
+    "tags": lambda args: actions("select").list_tags(),
+    "add": lambda args: actions("insert").insert_command(args),
+    "rm": lambda args: actions("delete").delete_command(args),
+    "edit": lambda args: actions("update").edit_command(args),
+    "retag": lambda args: actions("update").retag_commands(args),
+    "cp": lambda args: actions("other").copy_to_clipboard(args),
+    "import": lambda args: actions("transfer").import_commands(args),
+    "export": lambda args: actions("transfer").export_commands(args),
+    "stats": lambda args: actions("stats").show_stats(args),
+    "maintain": lambda args: actions("maintain").maintain_sheet(),
+    "dedupe": lambda args: actions("maintain").dedupe_sheet(),
+    "clear": lambda args: actions("other").clear_screen(),
     "exit": lambda args: close(),
 }
 
 
+# what <tab> completes after each command, see DatabaseManager.complete
+COMPLETIONS = {
+    "create": "sheet",
+    "tag": "tag",
+    "tool": "tool",
+    "rm": "selection",
+    "edit": "id",
+    "retag": "selection",
+    "cp": "id",
+}
+
+# selection words of rm and retag besides ids, see parse_query
+SELECTORS = ("tool:", "tag:")
+
+# commands taking options first: <tab> completes the option, then what follows it (None for nothing)
+OPTION_COMPLETIONS = {
+    "ls": {"--page": None, "--after": "id"},
+}
+
+
+def complete(line: str, text: str) -> list:
+    from utils.db_manager import db_manager
+
+    words = line.split()
+
+    if not words:  # a command or a sheet to switch to
+        return sorted(
+            [command for command in COMMANDS_MAP if command.startswith(text)]
+            + db_manager.complete("sheet", text)
+        )
+
+    options = OPTION_COMPLETIONS.get(words[0])
+    if options and len(words) == 1:
+        return [option for option in options if option.startswith(text)]
+
+    kind = options.get(words[1]) if options and len(words) == 2 else COMPLETIONS.get(words[0])
+    if not kind:
+        return []
+
+    if kind == "selection":
+        return complete_selection(words[0], text)
+
+    # tag queries take +<tag> and -<tag>
+    sign = text[0] if kind == "tag" and text.startswith(("+", "-")) else ""
+
+    return [f"{sign}{name}" for name in db_manager.complete(kind, text[len(sign) :])]
+
+
+def complete_selection(command: str, text: str) -> list:
+    from utils.db_manager import db_manager
+
+    for selector in SELECTORS:
+        if text.startswith(selector):
+            return [f"{selector}{name}" for name in db_manager.complete(selector[:-1], text[len(selector) :])]
+
+    # retag edits are +<tag> and -<tag>
+    if command == "retag" and text.startswith(("+", "-")):
+        return [f"{text[0]}{name}" for name in db_manager.complete("tag", text[1:])]
+
+    return [selector for selector in SELECTORS if selector.startswith(text)] + db_manager.complete("id", text)
+
+
 def close():
+    from utils.db_manager import db_manager
+
+    if db_manager.is_on() and settings.maintain_on_exit == "ON":
+        db_manager.maintain(full=False)
+    db_manager.close()
     cli.cout("\n🐆💨💨 Bye!")
     sys.exit()
 
 
+# cheetah.py <sheet | -> <command> [args ...] [--format json|ndjson|tsv|human]
+# keep_open: the daemon keeps every sheet it used connected between commands
+def one_shot(argv: list, keep_open: bool = False) -> int:
+    from utils.db_manager import db_manager
+
+    format = "tsv"
+    if "--format" in argv:
+        at = argv.index("--format")
+        format = argv[at + 1] if at + 1 < len(argv) else ""
+        argv = argv[:at] + argv[at + 2 :]
+
+    if format not in set(cli.Format) or len(argv) < 2 or argv[1] not in COMMANDS_MAP:
+        sys.stderr.write("usage: cheetah.py <sheet | -> <command> [args ...] [--format json|ndjson|tsv|human]\n")
+        return 2
+
+    cli.set_format(format)
+    sheet, command, *args = argv
+
+    if not db_manager.activate(None if sheet == "-" else sheet):
+        sys.stderr.write(f"Error: sheet '{sheet}' does not exist.\n")
+        return 2
+    settings.switch_sheets(None if sheet == "-" else sheet)
+
+    import shlex
+
+    try:
+        COMMANDS_MAP[command](shlex.join(args))
+    except EOFError:
+        cli.cout("Error: unexpected end of input.", cli.MsgType.BAD_INPUT)
+
+    cli.flush_records()
+    if not keep_open:
+        db_manager.close()
+
+    return 1 if cli.output["errors"] else 0
+
+
 def cheetah():
     global COMMANDS_MAP
 
@@ -39,7 +156,7 @@ def cheetah():
     while True:
         try:
             action, args = cli.cin(
-                f"\n{settings.active_sheet}", fore=cli.Colors.ORANGE, split=1
+                f"\n{settings.active_sheet}", fore=cli.Colors.ORANGE, split=1, completer=complete
             )
 
             if not action:
@@ -50,11 +167,17 @@ def cheetah():
             if func:
                 func(args)
             else:
-                settings.switch_sheets(sheets.select_sheet(action))
+                settings.switch_sheets(actions("sheets").select_sheet(action))
 
         except (KeyboardInterrupt, EOFError):
             close()
 
 
 if __name__ == "__main__":
+    if sys.argv[1:] == ["--daemon"]:
+        from utils.daemon import serve
+
+        sys.exit(serve(one_shot, int(settings.daemon_idle)))
+    if len(sys.argv) > 1:
+        sys.exit(one_shot(sys.argv[1:]))
     cheetah()
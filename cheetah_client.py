@@ -0,0 +1,20 @@
+import sys
+
+from utils.daemon import forward
+
+
+# cheetah_client.py <sheet | -> <command> [args ...] [--format json|ndjson|tsv|human]
+# same as cheetah.py one-shot mode, run by the daemon (cheetah.py --daemon) if one is listening
+def main(argv: list) -> int:
+    status = forward(argv)
+
+    if status is None:
+        from cheetah import one_shot
+
+        status = one_shot(argv)
+
+    return status
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
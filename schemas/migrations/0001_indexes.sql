@@ -0,0 +1,5 @@
+-- Seek commands by tool (tool <tool>) and list them in tool order (ls)
+CREATE INDEX IF NOT EXISTS idx_commands_tool ON commands (tool);
+
+-- Seek command_tags by tag (tag <tag>), covering the command id
+CREATE INDEX IF NOT EXISTS idx_command_tags_tag ON command_tags (tag_id, command_id);
@@ -0,0 +1,5 @@
+-- no transaction: VACUUM cannot run inside one
+-- Let maintain give free pages back to the filesystem (PRAGMA incremental_vacuum).
+-- auto_vacuum only changes on existing sheets through a VACUUM, run once here
+PRAGMA auto_vacuum = INCREMENTAL;
+VACUUM;
@@ -0,0 +1,15 @@
+-- Content hash of tool + normalised args (see content_hash in utils/db_manager.py),
+-- unique so duplicates are found by one index seek. Commands duplicating an
+-- earlier one keep a NULL hash until `dedupe` merges them into it
+ALTER TABLE commands ADD COLUMN hash BLOB;
+
+-- the full-text update trigger would rewrite every row for the hash (see 0004)
+DROP TRIGGER IF EXISTS commands_fts_update;
+
+UPDATE commands SET hash = content_hash(tool, args);
+
+UPDATE commands
+SET hash = NULL
+WHERE id NOT IN (SELECT min(id) FROM commands GROUP BY hash);
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_commands_hash ON commands (hash);
@@ -0,0 +1,4 @@
+-- commands_fts_update fired on every UPDATE of commands, hash writes included, and
+-- rewrote the full-text row each time. Dropped here, search.sql creates it again
+-- on the columns it indexes in the same transaction (sheets with a search index only)
+DROP TRIGGER IF EXISTS commands_fts_update;
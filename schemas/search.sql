@@ -0,0 +1,26 @@
+-- Full-text index over commands (external content, kept in sync by triggers)
+CREATE VIRTUAL TABLE IF NOT EXISTS commands_fts USING fts5(
+    tool,
+    args,
+    desc,
+    content='commands',
+    content_rowid='id'
+);
+
+CREATE TRIGGER IF NOT EXISTS commands_fts_insert AFTER INSERT ON commands BEGIN
+    INSERT INTO commands_fts (rowid, tool, args, desc)
+    VALUES (new.id, new.tool, new.args, new.desc);
+END;
+
+CREATE TRIGGER IF NOT EXISTS commands_fts_delete AFTER DELETE ON commands BEGIN
+    INSERT INTO commands_fts (commands_fts, rowid, tool, args, desc)
+    VALUES ('delete', old.id, old.tool, old.args, old.desc);
+END;
+
+-- only writes of the indexed columns, not of hash (content_hash, dedupe)
+CREATE TRIGGER IF NOT EXISTS commands_fts_update AFTER UPDATE OF tool, args, desc ON commands BEGIN
+    INSERT INTO commands_fts (commands_fts, rowid, tool, args, desc)
+    VALUES ('delete', old.id, old.tool, old.args, old.desc);
+    INSERT INTO commands_fts (rowid, tool, args, desc)
+    VALUES (new.id, new.tool, new.args, new.desc);
+END;
@@ -1,12 +1,24 @@
 import readline
 import os
-import glob
+import sys
 
-from rich.console import Console
-from prompt_toolkit import prompt
+from contextlib import contextmanager
+from itertools import islice
 from enum import Enum
 
-rich_console = Console()
+# rich and prompt_toolkit are slow to import, so they are imported when first used
+rich_console = None
+
+# options of the rich console, the daemon sets them to its client's terminal
+console_options = {}
+
+# lines rendered and written at once by cout_lines
+LINES_BATCH = 1000
+
+PADDING = " " * 4
+
+# less: keep colours, quit if output fits in one screen, do not clear the screen
+DEFAULT_PAGER = "less -RFX"
 
 
 class Colors(str, Enum):
@@ -44,7 +56,35 @@ class CinType(str, Enum):
         return self.value
 
 
-_completer_cache = {"text": None, "matches": []}
+class Format(str, Enum):
+    HUMAN = "human"
+    JSON = "json"
+    NDJSON = "ndjson"
+    TSV = "tsv"
+
+    def __str__(self):
+        return self.value
+
+
+_completer_cache = {"text": None, "matches": [], "dirs": {}}
+
+# readline splits words on these by default, the main prompt only splits on spaces
+DEFAULT_DELIMS = readline.get_completer_delims()
+
+# in machine formats records go to stdout as data, messages to stderr, nothing is styled
+output = {"format": Format.HUMAN, "records": [], "errors": 0}
+
+
+def set_format(format: str):
+    """Select how records and messages are written (see Format) for a new
+    command: held records and the error count are reset."""
+    output["format"] = Format(format)
+    output["records"] = []
+    output["errors"] = 0
+
+
+def is_human() -> bool:
+    return output["format"] == Format.HUMAN
 
 
 def cout(
@@ -55,11 +95,146 @@ def cout(
     back: str = Colors.DEFAULT,
     endl: str = "\n",
 ):
+    if msg_type in (MsgType.FATAL_ERROR, MsgType.BAD_INPUT):
+        output["errors"] += 1
+
+    if not is_human():
+        if msg_type:  # only status and error messages, decorations are dropped
+            sys.stderr.write(f"{text.strip()}\n")
+        return
+
     fore = msg_type if msg_type else fore
     style = _style(bold, fore, back)
     _print(text, style, endl)
 
 
+def cout_records(records, line, fore: str = Colors.DEFAULT):
+    """Print records (dicts). In human format each record is printed as
+    line(record) with cout_lines, otherwise records are written as data.
+    JSON records are held until flush_records, so one command writes one array.
+    """
+    if is_human():
+        cout_lines((line(record) for record in records), fore=fore)
+        return
+
+    if output["format"] == Format.JSON:
+        output["records"].extend(records)
+        return
+
+    import json
+
+    for record in records:
+        if output["format"] == Format.NDJSON:
+            sys.stdout.write(f"{json.dumps(record)}\n")
+        else:
+            sys.stdout.write("\t".join(_tsv_field(value) for value in record.values()) + "\n")
+
+
+def flush_records():
+    """Write records held by cout_records (JSON format only)."""
+    if output["format"] == Format.JSON:
+        import json
+
+        sys.stdout.write(f"{json.dumps(output['records'])}\n")
+        output["records"] = []
+
+
+@contextmanager
+def pager():
+    """Stream everything printed with cout inside the block through $PAGER.
+    Output reaches the pager as it is produced. Does nothing if stdout is not
+    a terminal. Quitting the pager early stops the output silently.
+    """
+    global rich_console
+
+    if not is_human() or not sys.stdout.isatty():
+        yield
+        return
+
+    import shlex
+    import subprocess
+
+    command = shlex.split(os.environ.get("PAGER") or DEFAULT_PAGER)
+    try:
+        process = subprocess.Popen(command, stdin=subprocess.PIPE, text=True)
+    except OSError:  # no pager available, print as usual
+        yield
+        return
+
+    console = _console()
+    rich_console = _pager_console(process.stdin, console.width)
+    try:
+        yield
+    except (BrokenPipeError, KeyboardInterrupt):  # output stopped before its end
+        pass
+    finally:
+        rich_console = console
+        try:
+            process.stdin.close()
+        except BrokenPipeError:
+            pass
+        process.wait()
+
+
+def cout_lines(
+    lines,
+    msg_type: str = None,
+    bold: bool = True,
+    fore: str = Colors.DEFAULT,
+    back: str = Colors.DEFAULT,
+):
+    """Print many lines with the same style, LINES_BATCH lines per write.
+    Lines (str or Text) are never parsed as markup, so user data is printed
+    as is. When the console is not a terminal, lines are written as plain text.
+    Plain str lines skip rich rendering: the style is rendered once and its
+    escape codes are wrapped around every line.
+    """
+    fore = msg_type if msg_type else fore
+    style = _style(bold, fore, back)
+    lines = iter(lines)
+
+    from rich.control import strip_control_codes
+    from rich.text import Text
+
+    console = _console()
+    start, end = _escape_codes(style) if console.is_terminal else ("", "")
+
+    while batch := list(islice(lines, LINES_BATCH)):
+        if all(isinstance(line, str) for line in batch):
+            console.file.write(
+                "".join(f"{start}{PADDING}{strip_control_codes(line)}{end}\n" for line in batch)
+            )
+            continue
+
+        text = Text(style=style, end="")
+        for line in batch:
+            text.append(PADDING)
+            text.append(line)
+            text.append("\n")
+        console.print(text, soft_wrap=True, end="")
+
+    console.file.flush()
+
+
+def assemble(*parts):
+    """Join str and Text parts into a single Text (see cout_lines)."""
+    from rich.text import Text
+
+    return Text.assemble(*parts)
+
+
+def mark(text: str, start: str, end: str, style: str = "underline"):
+    """Style the spans of text between start and end markers (markers are removed)."""
+    from rich.text import Text
+
+    marked = Text()
+    for i, part in enumerate((text or "").split(start)):
+        match, _, rest = part.partition(end) if i else ("", "", part)
+        marked.append(match, style=style)
+        marked.append(rest)
+    return marked
+
+
 def cin(
     text: str = "",
     bold: bool = True,
@@ -71,6 +246,7 @@ def cin(
     allow_empty: bool = True,
     allow_edit: str = None,
     split: int = 0,
+    completer=None,
 ):
     if type == CinType.LIST:
         return _cin_list(text, bold, fore, back, symbol)
@@ -81,9 +257,12 @@ def cin(
         return _cin_path(symbol)
 
     if allow_edit:
+        from prompt_toolkit import prompt
+
         line = prompt(f" {symbol} ", default=allow_edit)
     else:
-        line = input(f" {symbol} ")  # use input to allow up and down arrow keys cycling
+        _set_completer(completer)
+        line = input(f" {symbol} " if is_human() else "")  # use input to allow up and down arrow keys cycling
 
     if not allow_empty and not line:  # do not allow for empty lines
         cout("Error: cannot provide an empty value.", MsgType.BAD_INPUT)
@@ -104,7 +283,25 @@ def cin(
     return tuple(parts)
 
 
+# completer(line, text) gets the line before the word being completed and the word
+def _set_completer(completer):
+    def complete(text, state):
+        if state == 0:
+            line = readline.get_line_buffer()[: readline.get_begidx()]
+            _completer_cache["matches"] = completer(line, text)
+        try:
+            return _completer_cache["matches"][state]
+        except IndexError:
+            return None
+
+    readline.set_completer(complete if completer else None)
+    readline.set_completer_delims(" \t\n")
+    readline.parse_and_bind("tab: menu-complete")
+
+
 def _cin_path(symbol):
+    _completer_cache["dirs"] = {}
+    readline.set_completer_delims(DEFAULT_DELIMS)
     readline.set_completer(_path_completer)
     readline.parse_and_bind("tab: menu-complete")
     readline.parse_and_bind('"\\e[Z": menu-complete-backward')
@@ -132,15 +329,22 @@ def _path_completer(text, state):
         if not dirname:
             dirname = "."
 
-        try:
-            if line.endswith("."):  # if aiming for hidden file only load hidden files
-                entries = os.listdir(dirname)
-            else:  # if not aiming for hidden file do not load hidden files
-                entries = [entry for entry in os.listdir(dirname) if not entry.startswith(".")]
-        except FileNotFoundError:
+        # directories are listed once per prompt
+        if dirname not in _completer_cache["dirs"]:
+            try:
+                _completer_cache["dirs"][dirname] = os.listdir(dirname)
+            except FileNotFoundError:
+                _completer_cache["dirs"][dirname] = None
+
+        entries = _completer_cache["dirs"][dirname]
+
+        if entries is None:
             _completer_cache["matches"] = []
             return None
 
+        if not line.endswith("."):  # if not aiming for hidden file do not load hidden files
+            entries = [entry for entry in entries if not entry.startswith(".")]
+
         matches = [entry for entry in entries if entry.startswith(prefix)]
 
         # if there is only one match and it's a dir, append / to enter dir
@@ -185,6 +389,25 @@ def _style(bold: bool = True, fore: str = Colors.DEFAULT, back: str = Colors.DEF
     return " ".join(parts)
 
 
+def _escape_codes(style: str) -> tuple[str, str]:
+    """Get the escape codes opening and closing style on the current console."""
+    from rich.text import Text
+
+    console = _console()
+    with console.capture() as capture:
+        console.print(Text("x", style=style), end="")
+    start, _, end = capture.get().partition("x")
+    return start, end
+
+
+def _tsv_field(value) -> str:
+    if value is None:
+        return ""
+    if isinstance(value, list):
+        value = " ".join(map(str, value))
+    return str(value).replace("\\", "\\\\").replace("\t", "\\t").replace("\n", "\\n")
+
+
 def _adjust_padding(text: str):
     padding = " " * 4
     i = text.rfind("\n")
@@ -197,4 +420,29 @@ def _adjust_padding(text: str):
 
 def _print(text: str, style: str, endl: str):
     text = _adjust_padding(text)
-    rich_console.print(f"[{style}]{text}[/{style}]", end=endl)
+    _console().print(f"[{style}]{text}[/{style}]", end=endl)
+
+
+def _console():
+    global rich_console
+
+    if rich_console is None:
+        from rich.console import Console
+
+        rich_console = Console(**console_options)
+
+    return rich_console
+
+
+def _pager_console(file, width: int):
+    from rich.console import Console
+
+    class PagerConsole(Console):
+        """Console writing into a pager. rich exits the process on a broken pipe,
+        here it only stops the output so the REPL keeps running."""
+
+        def on_broken_pipe(self):
+            self.quiet = True
+            raise BrokenPipeError
+
+    return PagerConsole(file=file, force_terminal=True, width=width)
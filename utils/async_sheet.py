@@ -0,0 +1,216 @@
+import asyncio
+import sqlite3
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+
+from utils.db_manager import DatabaseManager, SEARCH_MARKS
+from utils.settings_manager import settings, settings_path, DEFAULTS
+from utils.stats import connect
+
+
+# worker threads of an AsyncSheet, each one with its own connection
+WORKERS = 4
+
+
+class SheetNotFoundError(LookupError):
+    """Raised when <sheet>.db is not in the vault."""
+
+
+@dataclass(frozen=True)
+class Command:
+    id: int
+    tool: str
+    args: str
+    desc: str
+    tags: tuple = ()  # matched tags for tag queries, all tags for AsyncSheet.command, else empty
+
+
+@dataclass(frozen=True)
+class TagMatches:
+    commands: list  # Command, ordered by tool
+    missing: list  # tags of the query that are not in the sheet
+
+
+class AsyncSheet:
+    """Read-only asyncio API over a sheet, for embedding cheetah in other tools.
+
+    Queries run on a bounded thread pool, each worker thread with its own
+    connection, so they never block the event loop and several sheets can be
+    queried at once. Unlike DatabaseManager, nothing is printed: results are
+    returned as Command / TagMatches and errors are raised.
+
+        async with AsyncSheet("android_eng") as sheet:
+            matches = await sheet.commands_by_tags(["smali"], required=["reverse"])
+    """
+
+    def __init__(self, name: str, vault: str = None, workers: int = WORKERS, executor: ThreadPoolExecutor = None):
+        """Open a sheet
+
+        Args:
+            name: name of the sheet (excluding .db)
+            vault: vault directory, VAULT from the settings file if None
+            workers: size of the thread pool of the sheet
+            executor: thread pool to share between sheets instead (not shut down by close)
+
+        Raises:
+            SheetNotFoundError: <name>.db is not in the vault
+        """
+        self.name = name
+        self.path = Path(vault or settings.vault_path) / f"{name}.db"
+        # an explicit vault works without a settings file, with the default pragmas
+        self._settings = settings if vault is None or settings_path().exists() else DEFAULTS
+        if not self.path.exists():
+            raise SheetNotFoundError(name)
+
+        self._executor = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix=f"cheetah-{name}")
+        self._own_executor = executor is None
+        self._local = threading.local()
+        self._connections = []
+        self._lock = threading.Lock()
+        self._search_ready = False
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def close(self):
+        """Wait for running queries and close the connections."""
+        if self._own_executor:
+            await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+
+        with self._lock:
+            for conn in self._connections:
+                conn.close()
+            self._connections.clear()
+
+    async def tools(self) -> list:
+        """Get all tools in the sheet, in order."""
+        rows = await self._run(lambda conn: conn.execute("select distinct tool from commands order by tool"))
+        return [row[0] for row in rows]
+
+    async def tags(self) -> list:
+        """Get all tags in the sheet, in order."""
+        rows = await self._run(lambda conn: conn.execute("select tag from tags order by tag"))
+        return [row[0] for row in rows]
+
+    async def command(self, id: int):
+        """Get a command with all its tags
+
+        Args:
+            id: id of the command
+
+        Returns:
+            Command: the command, None if there is no command with id
+        """
+
+        def select(conn):
+            row = conn.execute("select id, tool, args, desc from commands where id = ?", (id,)).fetchone()
+            if row is None:
+                return None
+            tags = conn.execute(
+                """
+                select t.tag
+                from tags t
+                join command_tags ct on t.id = ct.tag_id
+                where ct.command_id = ?
+                order by t.tag
+                """,
+                (id,),
+            )
+            return _command(row, tuple(tag for tag, in tags))
+
+        return await self._run(select)
+
+    async def commands_by_tool(self, tool: str) -> list:
+        """Get the commands of a tool
+
+        Args:
+            tool: name of the tool
+
+        Returns:
+            list: Command using tool
+        """
+        rows = await self._run(DatabaseManager._select_commands_by_tool, tool)
+        return [_command(row) for row in rows]
+
+    async def commands_by_tags(self, tags: list, required: list = (), excluded: list = ()) -> TagMatches:
+        """Get commands tagged with at least one of tags (if any), every tag
+        in required and none of excluded, as DatabaseManager.get_commands_by_tags.
+
+        Args:
+            tags: list of tags, at least one must match
+            required: list of tags that must all match
+            excluded: list of tags that must not match
+
+        Returns:
+            TagMatches: matching commands (with their matched tags) and unknown tags
+        """
+        commands, missing = await self._run(DatabaseManager._select_commands_by_tags, tags, required, excluded)
+        return TagMatches([_command(command, tuple(command["tags"])) for command in commands], missing)
+
+    async def search(self, terms: list, limit: int = 50, highlight: bool = False) -> list:
+        """Full-text search, best matches first (see DatabaseManager.search)
+
+        Args:
+            terms: search terms, a trailing '*' matches a prefix
+            limit: maximum number of commands
+            highlight: keep SEARCH_MARKS around matches. desc is a snippet of the description
+
+        Returns:
+            list: matching Command
+        """
+        query = DatabaseManager._fts_query(terms)
+        if not query:
+            return []
+
+        if not self._search_ready:
+            await self._run(self._create_search_index)
+            self._search_ready = True
+
+        rows = await self._run(DatabaseManager._select_search, query, limit)
+        commands = [_command(row) for row in rows]
+
+        if highlight:
+            return commands
+
+        def plain(text):
+            return text.replace(SEARCH_MARKS[0], "").replace(SEARCH_MARKS[1], "")
+
+        return [Command(c.id, plain(c.tool), plain(c.args), plain(c.desc)) for c in commands]
+
+    def _create_search_index(self, conn: sqlite3.Connection):
+        with self._lock:  # once, even if several searches start together
+            DatabaseManager._create_search_index(conn)
+
+    async def _run(self, query, *args):
+        """Run query(conn, *args) on a worker thread. Cursors are fetched there."""
+
+        def run():
+            result = query(self._connection(), *args)
+            return result.fetchall() if isinstance(result, sqlite3.Cursor) else result
+
+        return await asyncio.get_running_loop().run_in_executor(self._executor, run)
+
+    def _connection(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "connection", None)
+
+        if conn is None:
+            # only used by this thread, close() closes it from another one
+            conn = connect(self.path, check_same_thread=False)
+            conn.row_factory = sqlite3.Row
+            DatabaseManager._apply_pragmas(conn, self._settings)
+            self._local.connection = conn
+            with self._lock:
+                self._connections.append(conn)
+
+        return conn
+
+
+# args and desc may be NULL in the sheet, Command always holds text
+def _command(row, tags: tuple = ()) -> Command:
+    return Command(row["id"], row["tool"], row["args"] or "", row["desc"] or "", tags)
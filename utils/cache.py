@@ -0,0 +1,55 @@
+from collections import OrderedDict
+
+
+# returned by LRUCache.get when a key is not cached (None is a valid cached value)
+MISS = object()
+
+
+class LRUCache:
+    """Size-bounded cache of query results.
+    Once maxsize entries are cached, the least recently used one is evicted.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        self.maxsize = maxsize
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        """Get a cached value and mark it as recently used
+
+        Args:
+            key: hashable key of the value
+
+        Returns:
+            cached value, MISS if key is not cached
+        """
+        value = self.entries.get(key, MISS)
+
+        if value is MISS:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self.entries.move_to_end(key)
+
+        return value
+
+    def put(self, key, value):
+        """Cache a value, evicting the least recently used one if full
+
+        Args:
+            key: hashable key of the value
+            value: value to cache
+        """
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+
+        if len(self.entries) > self.maxsize:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+
+    def __len__(self):
+        return len(self.entries)
@@ -0,0 +1,149 @@
+import json
+import os
+import sqlite3
+import time
+
+from pathlib import Path
+
+
+# file in the vault holding the catalog, not a .db so it is never taken for a sheet
+CATALOG_FILE = ".catalog.json"
+
+# seconds sheet names are trusted without looking at the vault (`sheets` always looks)
+CATALOG_TTL = 5
+
+
+class Catalog:
+    """Sheets of a vault with their command and tag counts, size and
+    last-modified time, kept in CATALOG_FILE in the vault.
+
+    The vault directory changes mtime when a sheet (or its -wal file) is
+    created or removed, so one stat of the directory tells if the catalog
+    is still valid. Sheets are only stat'ed when it is not, and counted
+    when their size or mtime changed, or when this process wrote to them
+    (see touch).
+    """
+
+    def __init__(self, vault: Path):
+        self.vault = vault
+        self.path = vault / CATALOG_FILE
+        self.version = None  # vault mtime when the sheets were listed
+        self.checked = None  # time.monotonic() of the last look at the vault
+        self.sheets = None  # name -> {size, modified, commands, tags}, loaded on first use
+
+    def __contains__(self, name: str) -> bool:
+        return name in self._check(CATALOG_TTL)
+
+    def names(self, max_age: float = CATALOG_TTL) -> list:
+        """Get the names of the sheets
+
+        Args:
+            max_age: seconds since the last look at the vault after which it is looked at again
+
+        Returns:
+            list: sheet names in order
+        """
+        return list(self._check(max_age))
+
+    def entries(self) -> dict:
+        """Get every sheet with its metadata, counting the sheets that changed.
+
+        Returns:
+            dict: sheet name -> {size (bytes), modified (timestamp), commands, tags}
+        """
+        sheets = self._check(0)
+        changed = False
+
+        for name, entry in sheets.items():
+            if "size" not in entry:
+                entry.update(self._stat(name))
+            if "commands" not in entry:
+                entry.update(self._count(name))
+                changed = True
+
+        if changed:
+            self._save()
+
+        return sheets
+
+    def add(self, name: str):
+        """Add a sheet created by this process, counted on next use."""
+        self._check(CATALOG_TTL)[name] = {}
+
+    def touch(self, name: str):
+        """Forget the metadata of a sheet this process wrote to."""
+        if self.sheets and name in self.sheets:
+            self.sheets[name] = {}
+
+    def _check(self, max_age: float) -> dict:
+        if self.sheets is None:
+            self._load()
+
+        now = time.monotonic()
+        if self.checked is not None and now - self.checked < max_age:
+            return self.sheets
+        self.checked = now
+
+        version = self.vault.stat().st_mtime_ns
+        if version != self.version:
+            known = self.sheets
+            self.sheets = {}
+            for name in self._list():
+                stat = self._stat(name)
+                entry = known.get(name, {})
+                unchanged = (entry.get("size"), entry.get("modified")) == (stat["size"], stat["modified"])
+                self.sheets[name] = entry if unchanged else stat
+            self.version = version
+
+        return self.sheets
+
+    def _list(self) -> list:
+        return sorted(entry.name[:-3] for entry in os.scandir(self.vault) if entry.name.endswith(".db"))
+
+    def _stat(self, name: str) -> dict:
+        # writes may only be in the -wal file until it is checkpointed
+        size, modified = 0, 0
+        for suffix in (".db", ".db-wal"):
+            try:
+                stat = (self.vault / f"{name}{suffix}").stat()
+            except FileNotFoundError:
+                continue
+            size += stat.st_size
+            modified = max(modified, stat.st_mtime)
+
+        return {"size": size, "modified": modified}
+
+    def _count(self, name: str) -> dict:
+        conn = sqlite3.connect(self.vault / f"{name}.db")
+        try:
+            return {
+                "commands": conn.execute("select count(*) from commands").fetchone()[0],
+                "tags": conn.execute("select count(*) from tags").fetchone()[0],
+            }
+        except sqlite3.Error:  # not a sheet, or a broken one
+            return {"commands": None, "tags": None}
+        finally:
+            conn.close()
+
+    def _load(self):
+        try:
+            catalog = json.loads(self.path.read_text(encoding="utf-8"))
+            self.version, self.sheets = catalog["version"], catalog["sheets"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.version, self.sheets = None, {}
+
+    def _save(self):
+        # written in place: creating or renaming a file would change the vault
+        # mtime the catalog is validated against
+        try:
+            if not self.path.exists():
+                self.path.touch()
+            self.version = self.vault.stat().st_mtime_ns
+            if self._list() != list(self.sheets):  # changed meanwhile, list again next time
+                self.version = None
+
+            with open(self.path, "r+", encoding="utf-8") as file:
+                file.write(json.dumps({"version": self.version, "sheets": self.sheets}))
+                file.truncate()
+        except OSError:
+            pass  # read-only vault, the catalog is rebuilt in memory next time
@@ -0,0 +1,138 @@
+import base64
+import os
+import shutil
+import subprocess
+import sys
+
+
+# clipboard programs by backend name, reading the text to copy from stdin
+COMMANDS = {
+    "PBCOPY": ["pbcopy"],
+    "WL-COPY": ["wl-copy"],
+    "XCLIP": ["xclip", "-selection", "clipboard"],
+    "XSEL": ["xsel", "--clipboard", "--input"],
+}
+
+# terminal escape setting the system clipboard (OSC 52), understood by most
+# terminal emulators, also through ssh
+OSC52 = "\x1b]52;c;{}\x07"
+
+
+class ClipboardError(Exception):
+    """Raised when no backend could copy the text."""
+
+
+class Clipboard:
+    """System clipboard, through the fastest backend available.
+
+    The backend is detected on the first copy and kept for the session:
+    CLIPBOARD from the settings file if it is not AUTO, else pbcopy on
+    macOS, wl-copy on Wayland, xclip or xsel on X11, OSC 52 written to the
+    terminal when there is no display (ssh, headless boxes) and pyperclip
+    as a last resort. Clipboard programs take one text per run, so they are
+    run once per copy.
+    """
+
+    _instance = None
+
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(Clipboard, cls).__new__(cls)
+            cls.backend = None  # backend name, detected on first copy
+            cls.command = None  # program and arguments of command backends
+        return cls._instance
+
+    def copy(self, text: str) -> str:
+        """Copy text to the clipboard
+
+        Args:
+            text: text to copy
+
+        Raises:
+            ClipboardError: the backend failed
+
+        Returns:
+            str: name of the backend used
+        """
+        if self.backend is None:
+            self._detect()
+
+        data = text.encode("utf-8")
+
+        if self.backend == "OSC52":
+            self._write_osc52(data)
+        elif self.backend == "PYPERCLIP":
+            import pyperclip  # slow to import, only needed here
+
+            try:
+                pyperclip.copy(text)
+            except pyperclip.PyperclipException as e:
+                raise ClipboardError(str(e)) from e
+        else:
+            self._run(data)
+
+        return self.backend
+
+    def _detect(self):
+        from utils.settings_manager import settings
+
+        backend = settings.clipboard
+        if backend == "AUTO":
+            backend = _auto_backend()
+
+        self.backend = backend
+        if backend in COMMANDS:
+            program, *args = COMMANDS[backend]
+            self.command = [shutil.which(program) or program, *args]
+
+    def _run(self, data: bytes):
+        program = os.path.basename(self.command[0])
+
+        # xclip, xsel and wl-copy stay in the background holding the selection, so their
+        # output is never captured: reading it would wait until another program takes it
+        try:
+            process = subprocess.run(self.command, input=data, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        except OSError as e:
+            raise ClipboardError(f"could not run {program}: {e.strerror}") from e
+
+        if process.returncode:
+            raise ClipboardError(f"{program} exited with status {process.returncode}")
+
+    def _write_osc52(self, data: bytes):
+        sequence = OSC52.format(base64.b64encode(data).decode("ascii"))
+
+        # tmux and screen only hand escapes over to the terminal inside a passthrough sequence
+        if os.environ.get("TMUX"):
+            sequence = "\x1bPtmux;{}\x1b\\".format(sequence.replace("\x1b", "\x1b\x1b"))
+        elif os.environ.get("STY"):
+            sequence = f"\x1bP{sequence}\x1b\\"
+
+        try:
+            with open("/dev/tty", "w") as tty:
+                tty.write(sequence)
+        except OSError:
+            if not sys.stdout.isatty():
+                raise ClipboardError("no display and no terminal to copy through")
+            sys.stdout.write(sequence)
+            sys.stdout.flush()
+
+
+def _auto_backend() -> str:
+    """Pick the backend for this machine and session."""
+    if sys.platform == "darwin":
+        return "PBCOPY"
+
+    if sys.platform.startswith(("linux", "freebsd", "openbsd", "netbsd")):
+        if os.environ.get("WAYLAND_DISPLAY") and shutil.which("wl-copy"):
+            return "WL-COPY"
+        if os.environ.get("DISPLAY"):
+            for backend in ("XCLIP", "XSEL"):
+                if shutil.which(COMMANDS[backend][0]):
+                    return backend
+        if not os.environ.get("WAYLAND_DISPLAY") and not os.environ.get("DISPLAY"):
+            return "OSC52"
+
+    return "PYPERCLIP"
+
+
+clipboard = Clipboard()
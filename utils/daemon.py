@@ -0,0 +1,269 @@
+import os
+import struct
+import sys
+
+# cheetah_client.py imports this module and must start fast: the client only uses
+# the C module behind socket (socket imports enum and selectors) and nothing that
+# imports re (json, pathlib, os.path.expandvars). The server imports the rest.
+import _socket
+
+# socket of the daemon, next to the settings file it serves
+SOCKET_PATH = os.path.expanduser("~/.config/cheetah/daemon.sock")
+
+# requests and replies are frames: channel and payload length. A request is
+# cwd, tty, terminal width and argv separated by NUL (never part of an argument),
+# replies are output (stdout or stderr) and finally the exit status
+FRAME = struct.Struct(">cI")
+REQUEST, STDOUT, STDERR, EXIT = b"r", b"o", b"e", b"x"
+
+# output is sent when this much is buffered, or when the command flushes
+FRAME_BYTES = 64 * 1024
+
+# commands run by the client itself: they prompt on its terminal or use its screen and clipboard
+LOCAL_COMMANDS = {"add", "edit", "cp", "clear", "exit"}
+
+
+# client side
+def forward(argv: list):
+    """Run a one-shot command on the daemon, streaming its output to
+    stdout and stderr as it is produced.
+
+    Args:
+        argv: one-shot arguments, <sheet | -> <command> [args ...] [--format F]
+
+    Returns:
+        int: exit status of the command, None if it must run locally
+            (no daemon listening, or a command in LOCAL_COMMANDS)
+    """
+    words = list(argv)
+    if "--format" in words:
+        at = words.index("--format")
+        del words[at : at + 2]
+
+    if len(words) > 1 and words[1] in LOCAL_COMMANDS:
+        return None
+
+    client = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        client.connect(SOCKET_PATH)
+    except OSError:
+        client.close()
+        return None
+
+    try:
+        width = os.get_terminal_size(sys.stdout.fileno()).columns
+    except (OSError, ValueError):
+        width = 0
+
+    request = "\0".join([os.getcwd(), str(int(sys.stdout.isatty())), str(width), *argv]).encode()
+    outputs = {STDOUT: sys.stdout.buffer, STDERR: sys.stderr.buffer}
+
+    try:
+        client.sendall(FRAME.pack(REQUEST, len(request)) + request)
+
+        while len(header := _receive(client, FRAME.size)) == FRAME.size:
+            channel, size = FRAME.unpack(header)
+            payload = _receive(client, size)
+            if channel == EXIT:
+                return int(payload)
+            try:
+                outputs[channel].write(payload)
+                outputs[channel].flush()
+            except BrokenPipeError:  # e.g. piped into head, the rest is not wanted
+                os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+                return 0
+    except ConnectionError:
+        pass
+    finally:
+        client.close()
+
+    sys.stderr.write("Error: the daemon closed the connection.\n")
+    return 1
+
+
+def _receive(client, size: int) -> bytes:
+    """Read exactly size bytes, fewer if the connection is closed."""
+    data = bytearray()
+    while len(data) < size:
+        chunk = client.recv(size - len(data))
+        if not chunk:
+            break
+        data += chunk
+    return bytes(data)
+
+
+# server side
+class _Channel:
+    """File-like stdout or stderr of a command run by the daemon.
+    Writes are buffered and sent to the client as frames."""
+
+    encoding = "utf-8"
+
+    def __init__(self, send, channel: bytes):
+        self.send = send
+        self.channel = channel
+        self.buffer = []
+        self.size = 0
+
+    def write(self, text: str) -> int:
+        self.buffer.append(text)
+        self.size += len(text)
+        if self.size >= FRAME_BYTES:
+            self.flush()
+        return len(text)
+
+    def flush(self):
+        if self.buffer:
+            payload = "".join(self.buffer).encode()
+            self.buffer, self.size = [], 0
+            self.send(self.channel, payload)
+
+    def isatty(self) -> bool:
+        return False
+
+
+def serve(run, idle: int) -> int:
+    """Serve one-shot commands on SOCKET_PATH until idle for idle seconds
+    (or SIGINT / SIGTERM).
+
+    Clients are served concurrently but commands run one at a time on a
+    single thread, as they share the DatabaseManager. Each request names
+    its sheet, which is activated for it, so clients never see each other's
+    active sheet while every sheet used keeps its connection and caches.
+
+    Args:
+        run: function running a one-shot command, run(argv, keep_open=True) -> exit status
+        idle: seconds without clients before the daemon exits
+
+    Returns:
+        int: exit status of the daemon
+    """
+    import asyncio
+
+    from ui import prettier_cli as cli
+
+    if _listening():
+        cli.cout(f"Error: a daemon is already listening on {SOCKET_PATH}.", cli.MsgType.BAD_INPUT)
+        return 1
+
+    _remove_socket()  # left by a daemon that did not exit cleanly
+
+    try:
+        asyncio.run(_serve(run, idle))
+    finally:
+        _remove_socket()
+
+    return 0
+
+
+def _listening() -> bool:
+    probe = _socket.socket(_socket.AF_UNIX, _socket.SOCK_STREAM)
+    try:
+        probe.connect(SOCKET_PATH)
+    except OSError:
+        return False
+    finally:
+        probe.close()
+    return True
+
+
+def _remove_socket():
+    try:
+        os.unlink(SOCKET_PATH)
+    except FileNotFoundError:
+        pass
+
+
+async def _serve(run, idle: int):
+    import asyncio
+    import signal
+
+    from concurrent.futures import ThreadPoolExecutor
+
+    from ui import prettier_cli as cli
+
+    loop = asyncio.get_running_loop()
+    worker = ThreadPoolExecutor(max_workers=1)
+    clients = {"count": 0, "since": loop.time()}
+
+    async def handle(reader, writer):
+        clients["count"] += 1
+
+        async def send(channel: bytes, payload: bytes):
+            writer.write(FRAME.pack(channel, len(payload)) + payload)
+            await writer.drain()
+
+        def send_from_worker(channel: bytes, payload: bytes):
+            asyncio.run_coroutine_threadsafe(send(channel, payload), loop).result()
+
+        try:
+            # a client may send several requests, each run once the previous one is done
+            while True:
+                channel, size = FRAME.unpack(await reader.readexactly(FRAME.size))
+                if channel != REQUEST:
+                    break
+                cwd, tty, width, *argv = (await reader.readexactly(size)).decode().split("\0")
+                request = {"argv": argv, "cwd": cwd, "tty": tty == "1", "width": int(width) or None}
+                status = await loop.run_in_executor(worker, _run, run, request, send_from_worker)
+                await send(EXIT, str(status).encode())
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass  # the client is gone or not speaking our protocol
+        finally:
+            clients["count"] -= 1
+            clients["since"] = loop.time()
+            writer.close()
+
+    stop = asyncio.Event()
+    for signum in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(signum, stop.set)
+
+    # the socket is created 0600, other users must never get a window to connect in
+    umask = os.umask(0o077)
+    try:
+        server = await asyncio.start_unix_server(handle, path=SOCKET_PATH)
+    finally:
+        os.umask(umask)
+    os.chmod(SOCKET_PATH, 0o600)
+    cli.cout(f"Listening on {SOCKET_PATH}, exiting after {idle}s without clients.", cli.MsgType.SUCCESS)
+
+    async with server:
+        while not stop.is_set():
+            try:
+                await asyncio.wait_for(stop.wait(), timeout=min(idle, 5))
+            except asyncio.TimeoutError:
+                pass
+            if not clients["count"] and loop.time() - clients["since"] >= idle:
+                break
+
+    worker.shutdown()
+
+
+# runs on the worker thread, one request at a time
+def _run(run, request: dict, send) -> int:
+    import io
+
+    from ui import prettier_cli as cli
+
+    streams = sys.stdin, sys.stdout, sys.stderr
+    sys.stdout, sys.stderr = _Channel(send, STDOUT), _Channel(send, STDERR)
+    sys.stdin = io.StringIO()  # never prompt, the client's terminal is not ours
+
+    cli.rich_console = None
+    cli.console_options = {"force_terminal": request["tty"], "width": request["width"]}
+
+    try:
+        os.chdir(request["cwd"])  # import and export paths are relative to the client
+        status = run(request["argv"], keep_open=True)
+        sys.stdout.flush()
+        sys.stderr.flush()
+        return status
+    except SystemExit as exit:
+        return exit.code if isinstance(exit.code, int) else int(exit.code is not None)
+    except ConnectionError:  # client gone, the rest of the output is dropped
+        return 1
+    except Exception as error:
+        sys.stderr.write(f"Error: {error}\n")
+        sys.stderr.flush()
+        return 1
+    finally:
+        sys.stdin, sys.stdout, sys.stderr = streams
@@ -1,15 +1,86 @@
+import json
 import sqlite3
+import time
 
 from contextlib import contextmanager
-from collections import defaultdict
 from functools import wraps
+from itertools import islice
 from pathlib import Path
 
 from utils.settings_manager import settings
+from utils.fuzzy import TrigramIndex
+from utils.prefix import PrefixIndex
+from utils.cache import LRUCache, MISS
+from utils.catalog import Catalog
+from utils.stats import stats, timed, connect
 
 from ui import prettier_cli as cli
 
 
+# schemas/ directory of the package, regardless of the working directory
+SCHEMAS_PATH = Path(__file__).resolve().parent.parent / "schemas"
+
+# bound parameters per statement, below the lowest SQLITE_MAX_VARIABLE_NUMBER (999)
+MAX_VARIABLES = 900
+
+# threads querying sheets in parallel for vault-wide queries
+VAULT_WORKERS = 8
+
+# query results kept by the read-through cache of the active sheet
+CACHE_ENTRIES = 128
+
+# first line of migrations that cannot run inside a transaction (VACUUM)
+NO_TRANSACTION = "-- no transaction"
+
+# errors meaning the connection itself is unusable (sheet file replaced, corrupted or
+# gone), unlike transient ones such as SQLITE_BUSY that keep the connection and caches
+BROKEN_CONNECTION_ERRORS = ("SQLITE_NOTADB", "SQLITE_CORRUPT", "SQLITE_IOERR", "SQLITE_CANTOPEN", "SQLITE_READONLY_DBMOVED")
+
+# free pages given back per PRAGMA incremental_vacuum step of maintain
+VACUUM_STEP_PAGES = 1000
+
+# seconds maintain may spend giving pages back, the rest is left for next time
+VACUUM_BUDGET = 2.0
+EXIT_VACUUM_BUDGET = 0.2
+
+# attributes of the active sheet that activate parks while another sheet is used
+SHEET_STATE = (
+    "database_path",
+    "connection",
+    "search_ready",
+    "fuzzy_indexes",
+    "prefix_indexes",
+    "query_cache",
+    "data_version",
+    "snapshot",
+)
+
+# markers wrapped around search matches by DatabaseManager.search
+SEARCH_MARK_START = "\x02"
+SEARCH_MARK_END = "\x03"
+SEARCH_MARKS = (SEARCH_MARK_START, SEARCH_MARK_END)
+
+
+# hashlib.blake2b, imported by the first content_hash (hashlib loads OpenSSL)
+_blake2b = None
+
+
+# content hash of a command: tool and args with runs of whitespace collapsed
+def content_hash(tool: str, args: str) -> bytes:
+    """Hash identifying duplicate commands, also registered as the SQL function content_hash(tool, args)
+
+    Returns:
+        bytes: 16 bytes blake2b digest
+    """
+    global _blake2b
+    if _blake2b is None:
+        from hashlib import blake2b as _blake2b
+
+    tool, args = ("" if value is None else str(value) for value in (tool, args))
+    normalised = f"{tool.strip()}\0{' '.join(args.split())}"
+    return _blake2b(normalised.encode("utf-8"), digest_size=16).digest()
+
+
 class DatabaseManager:
 
     _instance = None
@@ -18,12 +89,26 @@ class DatabaseManager:
         if cls._instance is None:
             cls._instance = super(DatabaseManager, cls).__new__(cls)
             cls.vault_path = Path(settings.vault_path)
-            cls.schema_path = Path(".") / f"{schema}.sql"
+            cls.catalog = Catalog(cls.vault_path)
+            cls.schema_path = SCHEMAS_PATH / f"{schema}.sql"
+            cls.migrations_path = SCHEMAS_PATH / "migrations"
             cls.database_path = None
             cls.connection = None
+            cls.sessions = 0  # sessions open, nested ones included
+            cls.dropped = None  # broken connection, closed when the outermost session ends
+            cls.search_ready = False
+            cls.fuzzy_indexes = {}
+            cls.prefix_indexes = {}
+            cls.sheet_index = (None, None)
+            cls.query_cache = LRUCache(CACHE_ENTRIES)
+            cls.data_version = None
+            cls.snapshot = None
+            cls.parked = {}
+            stats.configure(settings.stats == "ON", int(settings.slow_query_ms), settings.slow_query_log or None)
         return cls._instance
 
     # > <sheet>
+    @timed
     def change_database(self, database: str) -> bool:
         """Change path of current active DB.
         Looks for the existence of <database>.db file in vault dir.
@@ -38,10 +123,60 @@ class DatabaseManager:
             return False
 
         self.database_path = self.vault_path / f"{database}.db"
+        self._connect()
+        self._migrate()
+        self._load_snapshot()
+
+        return True
+
+    # daemon: sheets used by its clients stay connected, with their caches
+    @timed
+    def activate(self, database: str) -> bool:
+        """Make database the active sheet. Unlike change_database, the
+        connection, caches and name indexes of the previous sheet are parked
+        and reused when it is activated again.
+
+        Args:
+            database (str): name of the DB (excluding .db), None for no active sheet
+
+        Returns:
+            bool: True if <database>.db in vault dir exists.
+        """
+        if database and not self._database_exists(database):
+            return False
+
+        path = self.vault_path / f"{database}.db" if database else None
+        if path == self.database_path:
+            return True
+
+        if self.database_path:
+            self.parked[self.database_path] = {attr: getattr(self, attr) for attr in SHEET_STATE}
+
+        state = self.parked.pop(path, None)
+        if state:
+            for attr, value in state.items():
+                setattr(self, attr, value)
+            return True
+
+        # new objects, the parked sheet keeps its own
+        self.database_path = path
+        self.connection = None
+        self.search_ready = False
+        self.fuzzy_indexes = {}
+        self.prefix_indexes = {}
+        self.query_cache = LRUCache(CACHE_ENTRIES)
+        self.data_version = None
+        self.snapshot = None
+
+        if path:
+            self._connect()
+            self._migrate()
+            self._load_snapshot()
 
         return True
 
     # > create <sheet>
+    @timed
     def create(self, database: str) -> bool:
         """Create DB. Does not overwrite if it already exists
 
@@ -51,15 +186,21 @@ class DatabaseManager:
         Returns:
             bool: True if DB was created successfully
         """
-        if self._database_exists(database):
+        path = self.vault_path / f"{database}.db"
+        if path.exists():  # not the catalog, never overwrite a sheet it does not know yet
             return False
 
-        self.database_path = self.vault_path / f"{database}.db"
+        self.database_path = path
+        self._connect()
         self._execute_schema()
+        self._migrate()
+        self._ensure_search_index()
+        self.catalog.add(database)
 
         return True
 
     # > add
+    @timed
     def add_command(self, tool: str, args: str, desc: str, tags: list):
         """Add entry to command to DB with its tags.
 
@@ -69,23 +210,35 @@ class DatabaseManager:
             desc (str): brief description of command
             tags (list): list of tags associated to the command
         """
-        self._connect()
         with self.session() as conn:
+            fresh = self._snapshot_is_fresh(conn)
+
             with conn:
                 cursor = conn.cursor()
 
                 cursor.execute(
                     """
-                    insert into commands (tool, args, desc) 
-                    values (?, ?, ?)
+                    insert into commands (tool, args, desc, hash) 
+                    values (?, ?, ?, ?)
                     """,
-                    (tool, args, desc),
+                    (tool, args, desc, content_hash(tool, args)),
                 )
                 command_id = cursor.lastrowid
 
-        self.add_tags_to_commands(command_id, tags)
+                self._insert_tags(cursor, command_id, tags)
+
+            # the snapshot takes the command in place instead of being loaded again
+            if fresh and self.snapshot.add(command_id, tool, args, desc, tags):
+                self.snapshot.changes = conn.total_changes
+
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
+        self._index_add("tool", [tool])
+        self._index_add("tag", tags)
+        self._index_add("id", [str(command_id)])
 
     # add_command and _edit_tags
+    @timed
     def add_tags_to_commands(self, command_id: int, tags: str):
         """Associate a list of tags to a command
 
@@ -95,35 +248,142 @@ class DatabaseManager:
         """
         with self.session() as conn:
             with conn:
-                cursor = conn.cursor()
+                self._insert_tags(conn.cursor(), command_id, tags)
 
-                cursor.executemany(  # insert tags in case there are new tags
-                    f"""
-                    insert or ignore into tags (tag)
-                    values (?)
-                    """,
-                    [(tag,) for tag in tags],
-                )
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
+        self._index_add("tag", tags)
 
-                placeholders = ", ".join("?" * len(tags))
-                cursor.execute(  # select ids of tags to later insert in joint table
-                    f"""
-                    select id
-                    from tags
-                    where tag in ({placeholders})
-                    """,
-                    tags,
-                )
+    # > import <file>
+    @timed
+    def import_commands(self, records, chunk_size: int = 5000) -> dict:
+        """Bulk insert commands, committing every chunk_size commands.
+        Records are consumed lazily, so memory does not grow with the input.
+        Records duplicating a command (same content_hash, in the sheet or
+        earlier in records) are not inserted, their tags are merged into it.
 
-                cursor.executemany(  # insert command_id and tag ids in joint table
-                    """
-                    insert or ignore into command_tags
-                    values (?, ?)
-                    """,
-                    [(command_id, tag_id["id"]) for tag_id in cursor],
-                )
+        Args:
+            records: iterable of dicts with keys tool, args, desc and tags (list)
+            chunk_size: commands inserted per transaction
+
+        Returns:
+            dict: number of commands inserted and of duplicates merged, as inserted and merged
+        """
+        records = iter(records)
+        inserted = merged = 0
+
+        while chunk := list(islice(records, chunk_size)):
+            with self.session() as conn:
+                with conn:
+                    conn.execute("BEGIN IMMEDIATE")  # ids below are only ours while we hold the lock
+                    cursor = conn.cursor()
+
+                    cursor.execute(
+                        """
+                        select max(
+                            coalesce((select seq from sqlite_sequence where name = 'commands'), 0),
+                            coalesce((select max(id) from commands), 0)
+                        )
+                        """
+                    )
+                    first_id = cursor.fetchone()[0] + 1
+
+                    # the search trigger flushes the full-text index on every row,
+                    # so it is dropped for the chunk and the chunk is indexed at once
+                    cursor.execute(
+                        """
+                        select sql
+                        from sqlite_master
+                        where type = 'trigger' and name = 'commands_fts_insert'
+                        """
+                    )
+                    search_trigger = cursor.fetchone()
+                    if search_trigger:
+                        cursor.execute("drop trigger commands_fts_insert")
+
+                    # each record goes to the command with its hash, a new one if there is none
+                    hashes = [content_hash(record["tool"], record["args"]) for record in chunk]
+                    ids = self._ids_by_hash(cursor, hashes)
+                    targets, new = [], []
+
+                    for record, hash in zip(chunk, hashes):
+                        if hash not in ids:
+                            ids[hash] = first_id + len(new)
+                            new.append((ids[hash], record["tool"], record["args"], record["desc"], hash))
+                        targets.append(ids[hash])
+
+                    cursor.executemany(
+                        """
+                        insert into commands (id, tool, args, desc, hash)
+                        values (?, ?, ?, ?, ?)
+                        """,
+                        new,
+                    )
+
+                    tag_ids = self._resolve_tag_ids(
+                        cursor, (tag for record in chunk for tag in record["tags"])
+                    )
+
+                    cursor.executemany(
+                        """
+                        insert or ignore into command_tags
+                        values (?, ?)
+                        """,
+                        [
+                            (command_id, tag_ids[tag])
+                            for command_id, record in zip(targets, chunk)
+                            for tag in record["tags"]
+                        ],
+                    )
+
+                    if search_trigger:
+                        cursor.execute(
+                            """
+                            insert into commands_fts (rowid, tool, args, desc)
+                            select id, tool, args, desc
+                            from commands
+                            where id >= ?
+                            """,
+                            (first_id,),
+                        )
+                        cursor.execute(search_trigger["sql"])
+
+            inserted += len(new)
+            merged += len(chunk) - len(new)
+
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
+        self._drop_indexes()
+
+        return {"inserted": inserted, "merged": merged}
+
+    # > export <file>
+    @timed
+    def export_commands(self):
+        """Stream every command of the sheet with its tags, in id order.
+
+        Yields:
+            dict: command with keys id, tool, args, desc and tags (list)
+        """
+        with self.session() as conn:
+            cursor = conn.execute(
+                """
+                select c.id, c.tool, c.args, c.desc, json_group_array(t.tag) as tags
+                from commands c
+                left join command_tags ct on c.id = ct.command_id
+                left join tags t on ct.tag_id = t.id
+                group by c.id
+                order by c.id
+                """
+            )
+
+            for command in cursor:
+                command = dict(command)
+                command["tags"] = [tag for tag in json.loads(command["tags"]) if tag]
+                yield command
 
     # > tool <tool>
+    @timed
     def get_commands_by_tool(self, tool: str) -> list:
         """Get commands where tool is used.
 
@@ -133,59 +393,167 @@ class DatabaseManager:
         Returns:
             list: commands with tool.
         """
+        return self._cached(
+            ("tool", tool),
+            lambda conn: self._select_commands_by_tool(conn, tool),
+            lambda snapshot: snapshot.commands_by_tool(tool),
+        )
+
+    # > tag <tag1> +<tag2> -<tag3> ...
+    @timed
+    def get_commands_by_tags(self, tags: list, required: list = (), excluded: list = ()) -> tuple[list, list]:
+        """Get commands tagged with at least one of tags (if any), every tag
+        in required and none of excluded. Each command is returned once.
+
+        Args:
+            tags: list of tags, at least one must match
+            required: list of tags that must all match
+            excluded: list of tags that must not match
+
+        Returns:
+            list: matching commands ordered by tool, with their matching tags (list) in 'tags'
+            list: list of tags not in the sheet
+        """
+        key = ("tags", tuple(tags), tuple(required), tuple(excluded))
+        return self._cached(
+            key,
+            lambda conn: self._select_commands_by_tags(conn, tags, required, excluded),
+            lambda snapshot: snapshot.commands_by_tags(tags, required, excluded),
+        )
+
+    # > search <term1> <term2> ...
+    @timed
+    def search(self, terms: list, limit: int = 50) -> list:
+        """Full-text search over tool, args and desc, best matches first.
+        Terms ending with '*' match by prefix and terms with spaces match
+        as phrases. Matches are wrapped between SEARCH_MARK_START and
+        SEARCH_MARK_END.
+
+        Args:
+            terms: list of terms to search for
+            limit: maximum number of results
+
+        Returns:
+            list: matching commands ranked by bm25
+        """
+        query = self._fts_query(terms)
+        if not query:
+            return []
+
+        self._ensure_search_index()
+
         with self.session() as conn:
-            cursor = conn.cursor()
+            return self._select_search(conn, query, limit)
 
-            cursor.execute(
-                """
-                select c.id, c.tool, c.args, c.desc
-                from commands c
-                where c.tool = ?
-                """,
-                (tool,),
-            )
+    # > tool <tool> --all
+    @timed
+    def get_commands_by_tool_in_vault(self, tool: str) -> dict:
+        """Get commands where tool is used in every sheet of the vault.
 
-            commands = cursor.fetchall()
+        Args:
+            tool: name of the tool (in cmd)
 
-        return [dict(command) for command in commands]
+        Returns:
+            dict: commands with tool by sheet, only sheets with commands.
+        """
+        return self._query_vault(self._select_commands_by_tool, tool)
 
-    # > tag <tag1> <tag2> <tag3> ...
-    def get_commands_by_tags(self, tags: list) -> tuple[dict, list]:
-        """Get commands associated to tags
+    # > tag <tag1> <tag2> ... --all
+    @timed
+    def get_commands_by_tags_in_vault(self, tags: list, required: list = (), excluded: list = ()) -> tuple[dict, list]:
+        """Get commands matching a tag query in every sheet of the vault.
+        See get_commands_by_tags.
 
         Args:
-            tags: list of tags to filter commands by
+            tags: list of tags, at least one must match
+            required: list of tags that must all match
+            excluded: list of tags that must not match
 
         Returns:
-            dict: commands by tag. Key is the tag and value is a list of commands.
-            list: list of tags with no commands
+            dict: commands by sheet, only sheets with commands.
+            list: list of tags not in any sheet
         """
-        tag_entries = defaultdict(list)
-        empty_tags = set(tags)
-        placeholders = ", ".join("?" for _ in tags)
-        with self.session() as conn:
-            cursor = conn.cursor()
+        results = self._query_vault(self._select_commands_by_tags, tags, required, excluded)
+        missing = set(tags) | set(required) | set(excluded)
+        for _, sheet_missing in results.values():
+            missing &= set(sheet_missing)
 
-            cursor.execute(
-                f"""
-                select c.id, c.tool, c.args, c.desc, t.tag
-                from commands c
-                join command_tags ct on c.id = ct.command_id
-                join tags t on ct.tag_id = t.id
-                where t.tag in ({placeholders})
-                order by c.tool
-                """,
-                tags,
-            )
+        commands = {sheet: result[0] for sheet, result in results.items() if result[0]}
+        return commands, [tag for tag in dict.fromkeys([*tags, *required, *excluded]) if tag in missing]
 
-            for command in cursor:
-                tag = command["tag"]
-                empty_tags.discard(tag)
-                tag_entries[tag].append(dict(command))
+    # > search <term1> <term2> ... --all
+    @timed
+    def search_vault(self, terms: list, limit: int = 50) -> dict:
+        """Full-text search in every sheet of the vault. See search.
+
+        Args:
+            terms: list of terms to search for
+            limit: maximum number of results per sheet
+
+        Returns:
+            dict: matching commands by sheet, only sheets with matches.
+        """
+        query = self._fts_query(terms)
+        if not query:
+            return {}
+
+        def search_sheet(conn):
+            self._create_search_index(conn)
+            return self._select_search(conn, query, limit)
+
+        return self._query_vault(search_sheet)
+
+    # > tool <tool> when tool is not found
+    @timed
+    def suggest_tools(self, tool: str, limit: int = 3) -> list:
+        """Get existing tools with a name similar to tool
+
+        Args:
+            tool: misspelled tool
+            limit: maximum number of suggestions
+
+        Returns:
+            list: similar tool names, most similar first
+        """
+        return self._fuzzy_index("tool").lookup(tool, limit)
+
+    # > tag <tag> when tag is not found
+    @timed
+    def suggest_tags(self, tag: str, limit: int = 3) -> list:
+        """Get existing tags with a name similar to tag
+
+        Args:
+            tag: misspelled tag
+            limit: maximum number of suggestions
+
+        Returns:
+            list: similar tag names, most similar first
+        """
+        return self._fuzzy_index("tag").lookup(tag, limit)
+
+    # <tab> in the prompt
+    @timed
+    def complete(self, kind: str, prefix: str, limit: int = 100) -> list:
+        """Get names of kind starting with prefix, for tab completion.
+
+        Args:
+            kind: 'sheet', 'tag', 'tool' or 'id' (tags, tools and ids of the active sheet)
+            prefix: beginning of the name
+            limit: maximum number of names
 
-        return dict(tag_entries), list(empty_tags)
+        Returns:
+            list: matching names in order
+        """
+        if kind == "sheet":
+            return self._sheet_index().complete(prefix, limit)
+
+        if not self.is_on():
+            return []
+
+        return self._prefix_index(kind).complete(prefix, limit)
 
     # > cp <id> and edit <id>
+    @timed
     def get_command_by_id(self, id: int) -> dict:
         """Get command by id
 
@@ -195,62 +563,129 @@ class DatabaseManager:
         Returns:
             dict: command as a dict
         """
-        with self.session() as conn:
-            cursor = conn.cursor()
-
-            cursor.execute(
+        def select(conn):
+            return conn.execute(
                 """
-                select *
+                select c.id, c.tool, c.args, c.desc
                 from commands c
                 where c.id = ?
                 """,
                 (id,),
-            )
-            command = cursor.fetchone()
+            ).fetchone()
 
-        return command
+        return self._cached(("command", int(id)), select, lambda snapshot: snapshot.command(int(id)))
 
-    # > ls
-    def get_commands(self) -> list:
-        """Get all commands in sheet
+    # > cp <id> <id> ...
+    @timed
+    def get_commands_by_ids(self, ids: list) -> dict:
+        """Get several commands at once, with one query per MAX_VARIABLES ids
+
+        Args:
+            ids: ids of the commands
 
         Returns:
-            list: all commands in sheet
+            dict: commands by id, ids without a command are left out
+        """
+        ids = list(dict.fromkeys(int(id) for id in ids))
+
+        def select(conn):
+            commands = {}
+            for start in range(0, len(ids), MAX_VARIABLES):
+                batch = ids[start : start + MAX_VARIABLES]
+                cursor = conn.execute(
+                    f"""
+                    select c.id, c.tool, c.args, c.desc
+                    from commands c
+                    where c.id in ({', '.join('?' * len(batch))})
+                    """,
+                    batch,
+                )
+                commands.update((row["id"], row) for row in cursor)
+            return commands
+
+        def from_snapshot(snapshot):
+            commands = {id: snapshot.command(id) for id in ids}
+            return {id: command for id, command in commands.items() if command}
+
+        return self._cached(("commands", tuple(ids)), select, from_snapshot)
+
+    # > add, import and edit
+    @timed
+    def find_duplicate(self, tool: str, args: str) -> int:
+        """Find the command with the same tool and args (see content_hash), by one index seek
+
+        Args:
+            tool: tool of the command
+            args: arguments of the command
+
+        Returns:
+            int: id of the duplicate, None if there is none
         """
         with self.session() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                """
-                select c.id, c.tool, c.args, c.desc
-                from commands c
-                order by c.tool
-                """
-            )
-            entries = cursor.fetchall()
+            row = conn.execute("select id from commands where hash = ?", (content_hash(tool, args),)).fetchone()
 
-        return entries
+        return row["id"] if row else None
+
+    # > ls
+    @timed
+    def get_commands(self, after: int = None, offset: int = 0, limit: int = None):
+        """Stream commands in sheet ordered by tool, settings.page_size rows at a time.
+        Pages after the first are fetched by keyset on (tool, id), so memory and
+        cost per page do not grow with the sheet.
+
+        Args:
+            after: id of the command to start after (in listing order)
+            offset: number of commands to skip
+            limit: maximum number of commands
+
+        Yields:
+            sqlite3.Row: command
+        """
+        page_size = max(1, int(settings.page_size))
+        key = None
+
+        if after is not None:
+            with self.session() as conn:
+                key = conn.execute(
+                    "select tool, id from commands where id = ?", (after,)
+                ).fetchone()
+            if not key:
+                return
+
+        while limit is None or limit > 0:
+            size = page_size if limit is None else min(page_size, limit)
+            entries = self._select_commands_page(key, offset, size)
+
+            yield from entries
+
+            if len(entries) < size:
+                return
+
+            key = (entries[-1]["tool"], entries[-1]["id"])
+            offset = 0
+            limit = None if limit is None else limit - size
 
     # > tags
+    @timed
     def get_tags(self) -> list:
         """Get all tags in the sheet
 
         Returns:
             list: all tags in the sheet
         """
-        with self.session() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+        def select(conn):
+            return conn.execute(
                 """
                 select tag 
                 from tags 
                 order by tag
                 """
-            )
-            entries = cursor.fetchall()
+            ).fetchall()
 
-        return entries
+        return self._cached(("all tags",), select)
 
     # _edit_tags
+    @timed
     def get_tags_from_command(self, id: int) -> list:
         """Get all tags associated to command with id
 
@@ -260,9 +695,8 @@ class DatabaseManager:
         Returns:
             list: tags associated to command
         """
-        with self.session() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+        def select(conn):
+            return conn.execute(
                 """
                 select t.tag
                 from tags t
@@ -271,60 +705,67 @@ class DatabaseManager:
                 order by t.tag
                 """,
                 (id,),
-            )
-            entries = cursor.fetchall()
+            ).fetchall()
 
-        return entries
+        return self._cached(("tags of", int(id)), select)
 
     # > tools
+    @timed
     def get_tools(self) -> list:
         """Get all tools in sheet
 
         Returns:
             list: tools in the sheet
         """
-        with self.session() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
+        def select(conn):
+            return conn.execute(
                 """
                 select distinct tool
                 from commands
                 order by tool
                 """
-            )
-            entries = cursor.fetchall()
+            ).fetchall()
 
-        return entries
+        return self._cached(("all tools",), select)
 
     # rm <id> <id> ...
-    def delete_command(self, ids: list) -> int:
-        """Delete commands by ids
+    @timed
+    def delete_command(self, ranges: list = (), tools: list = (), tags: list = ()) -> int:
+        """Delete the commands matching any of the predicates, in one transaction.
+        Ranges are deleted with BETWEEN and single ids in chunks of MAX_VARIABLES,
+        so no id list is built. Tags of deleted commands go with them (cascade).
 
         Args:
-            ids: list of ids of commands to delete
+            ranges: (first id, last id) tuples, both included
+            tools: tools whose commands are deleted
+            tags: tags whose commands are deleted
 
         Returns:
             int: number of commands deleted
         """
-        placeholders = ", ".join("?" * len(ids))
+        rowcount = 0
+
         with self.session() as conn:
             with conn:
-                conn.execute("PRAGMA foreign_keys = ON")
-                cursor = conn.execute(
-                    f"""
-                    delete from commands
-                    where id in ({placeholders})
-                    """,
-                    ids,
-                )
+                conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.cursor()
+
+                # rowcount of executemany is the sum over its parameters, rows deleted
+                # by an earlier predicate are not counted again
+                for condition, params in self._selections(ranges, tools, tags):
+                    cursor.executemany(f"delete from commands where {condition}", params)
+                    rowcount += cursor.rowcount
 
-                rowcount = cursor.rowcount
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
+        self._drop_indexes("tool", "id")  # last command of a tool may be gone
 
         return rowcount
 
     # > edit <id>
-    def delete_tag_from_command(self, id: int, tags: str) -> int:
-        """Remove tag from command
+    @timed
+    def delete_tag_from_command(self, id: int, tags: list) -> int:
+        """Remove tags from a command
 
         Args:
             id: command id
@@ -335,20 +776,15 @@ class DatabaseManager:
         """
         with self.session() as conn:
             with conn:
-                cursor = conn.executemany(
-                    f"""
-                    delete from command_tags
-                    where command_id = ?
-                    and tag_id in (select id from tags where tag in (?))
-                    """,
-                    [(id, tag) for tag in tags],
-                )
+                rowcount = self._remove_tags(conn.cursor(), [("id = ?", [(id,)])], tags)
 
-                rowcount = cursor.rowcount
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
 
         return rowcount
 
     # > edit <id>
+    @timed
     def update_command(self, updates: dict, command_id: int):
         """Update command fields
 
@@ -356,31 +792,295 @@ class DatabaseManager:
             updates: updated fields
             command_id: id of command to update
         """
-        placeholders = ", ".join(f"{key} = ?" for key in updates)
-        values = list(updates.values()) + [command_id]
         with self.session() as conn:
             with conn:
-                cursor = conn.execute(
-                    f"""
-                    update commands
-                    set {placeholders}
-                    where id = ?
-                    """,
-                    values,
-                )
+                rowcount = self._update_fields(conn.cursor(), command_id, updates)
+
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
 
-                rowcount = cursor.rowcount
+        if "tool" in updates:
+            self._drop_indexes("tool")
 
         return rowcount
 
-    # > sheets
+    # > maintain, and on exit
+    @timed
+    def maintain(self, full: bool = True) -> dict:
+        """Garbage-collect unused tags, refresh planner statistics and give
+        free pages back to the filesystem, VACUUM_STEP_PAGES at a time.
+
+        Args:
+            full: ANALYZE every table and spend up to VACUUM_BUDGET seconds on
+                free pages. Otherwise (on exit) only run what PRAGMA optimize
+                finds useful and spend up to EXIT_VACUUM_BUDGET.
+
+        Returns:
+            dict: orphan_tags (deleted), analyzed (list of (table, index, stat)),
+                bytes_reclaimed, free_pages (left)
+        """
+        with self.session() as conn:
+            with conn:
+                orphan_tags = conn.execute(
+                    """
+                    delete from tags
+                    where not exists (select 1 from command_tags ct where ct.tag_id = tags.id)
+                    """
+                ).rowcount
+
+            if full:
+                conn.execute("ANALYZE")
+                refreshed = None
+            else:
+                # 0x03: list the ANALYZE statements optimize would run, so they can be reported
+                refreshed = {
+                    statement.split(".")[-1].strip('"')
+                    for statement, in conn.execute("PRAGMA optimize(0x03)").fetchall()
+                }
+                if refreshed:
+                    conn.execute("PRAGMA optimize")
+
+            analyzed = [
+                tuple(row)
+                for row in conn.execute("select tbl, idx, stat from sqlite_stat1 order by tbl, idx")
+                if refreshed is None or row[0] in refreshed
+            ]
+
+            page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+            pages = conn.execute("PRAGMA page_count").fetchone()[0]
+
+            deadline = time.perf_counter() + (VACUUM_BUDGET if full else EXIT_VACUUM_BUDGET)
+            while conn.execute("PRAGMA freelist_count").fetchone()[0] and time.perf_counter() < deadline:
+                conn.execute(f"PRAGMA incremental_vacuum({VACUUM_STEP_PAGES})").fetchall()
+
+            reclaimed = (pages - conn.execute("PRAGMA page_count").fetchone()[0]) * page_size
+            if reclaimed:
+                conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()  # shrink the file itself
+
+            free_pages = conn.execute("PRAGMA freelist_count").fetchone()[0]
+
+        if orphan_tags:
+            self.query_cache.clear()
+            self.catalog.touch(self.is_on())
+            self._drop_indexes("tag")
+
+        return {"orphan_tags": orphan_tags, "analyzed": analyzed, "bytes_reclaimed": reclaimed, "free_pages": free_pages}
+
     def list_databases(self) -> list:
-        """List available DB files in vault
+        """List available DB files in vault (from the vault catalog)
 
         Returns:
             list: list of db files, including .db extension.
         """
-        return list(self.vault_path.glob("*.db"))
+        return [self.vault_path / f"{name}.db" for name in self.catalog.names()]
+
+    # > edit <id>, staged changes applied at once
+    @timed
+    def edit_command(self, command_id: int, updates: dict, add_tags: list = (), remove_tags: list = ()) -> dict:
+        """Update fields and tags of a command in one transaction
+
+        Args:
+            command_id: id of the command
+            updates: updated fields (tool, args, desc)
+            add_tags: tags to add
+            remove_tags: tags to remove
+
+        Returns:
+            dict: number of rows changed, as updated, tags_added and tags_removed
+        """
+        changes = {"updated": 0, "tags_added": 0, "tags_removed": 0}
+
+        with self.session() as conn:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.cursor()
+
+                if updates:
+                    changes["updated"] = self._update_fields(cursor, command_id, updates)
+
+                selection = [("id = ?", [(command_id,)])]
+                changes["tags_added"] = self._add_tags(cursor, selection, add_tags)
+                changes["tags_removed"] = self._remove_tags(cursor, selection, remove_tags)
+
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
+        if "tool" in updates:
+            self._drop_indexes("tool")
+        self._index_add("tag", add_tags)
+
+        return changes
+
+    # > retag <ids> tool:<tool> tag:<tag> +<tag> -<tag>
+    @timed
+    def retag(self, ranges: list = (), tools: list = (), tags: list = (), add: list = (), remove: list = ()) -> dict:
+        """Add and remove tags on every command matching any of the
+        predicates (see delete_command), with set-based statements in one transaction.
+
+        Returns:
+            dict: number of tag links added and removed, as tags_added and tags_removed
+        """
+        with self.session() as conn:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.cursor()
+                selection = list(self._selections(ranges, tools, tags))
+                changes = {
+                    "tags_added": self._add_tags(cursor, selection, add),
+                    "tags_removed": self._remove_tags(cursor, selection, remove),
+                }
+
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
+        self._index_add("tag", add)
+
+        return changes
+
+    # > retag --rename <old> <new>
+    @timed
+    def rename_tag(self, old: str, new: str) -> int:
+        """Rename a tag. If new already exists, old is merged into it.
+
+        Args:
+            old: tag to rename
+            new: new name
+
+        Returns:
+            int: number of commands tagged old, -1 if there is no tag old
+        """
+        with self.session() as conn:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                old_id = conn.execute("select id from tags where tag = ?", (old,)).fetchone()
+                if not old_id:
+                    return -1
+
+                count = conn.execute("select count(*) from command_tags where tag_id = ?", (old_id[0],)).fetchone()[0]
+                new_id = conn.execute("select id from tags where tag = ?", (new,)).fetchone()
+
+                if new_id and new_id[0] == old_id[0]:  # same tag, nothing to rename
+                    return count
+
+                if new_id:  # merge: links move to new, old and its remaining links go (cascade)
+                    conn.execute(
+                        """
+                        insert or ignore into command_tags (command_id, tag_id)
+                        select command_id, ? from command_tags where tag_id = ?
+                        """,
+                        (new_id[0], old_id[0]),
+                    )
+                    conn.execute("delete from tags where id = ?", (old_id[0],))
+                else:
+                    conn.execute("update tags set tag = ? where id = ?", (new, old_id[0]))
+
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
+        self._drop_indexes("tag")
+
+        return count
+
+    # > edit <id>, when the edited command duplicates another one
+    @timed
+    def merge_command(self, command_id: int, into: int, tags: list, desc: str = None) -> int:
+        """Merge a command into its duplicate: tags are added to into and
+        the command is deleted, in one transaction.
+
+        Args:
+            command_id: id of the command merged
+            into: id of the command kept
+            tags: tags of the command merged
+            desc: new description of into, None to keep its own
+
+        Returns:
+            int: number of tags added to into
+        """
+        with self.session() as conn:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.cursor()
+                added = self._add_tags(cursor, [("id = ?", [(into,)])], tags)
+                if desc is not None:
+                    cursor.execute("update commands set desc = ? where id = ?", (desc, into))
+                cursor.execute("delete from commands where id = ?", (command_id,))
+
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
+        self._drop_indexes("id", "tool")
+        self._index_add("tag", tags)
+
+        return added
+
+    # > dedupe
+    @timed
+    def dedupe(self) -> dict:
+        """Merge every duplicate command into the first command with its
+        content_hash, moving its tags, with set-based statements in one transaction.
+        Duplicates are the commands without a hash (left by the migration that
+        added it), those are hashed here.
+
+        Returns:
+            dict: number of commands merged and of tag links moved, as merged and tags_merged
+        """
+        with self.session() as conn:
+            with conn:
+                conn.execute("BEGIN IMMEDIATE")
+                cursor = conn.cursor()
+
+                cursor.execute("create temp table dedupe (id integer primary key, hash blob)")
+                cursor.execute("insert into dedupe select id, content_hash(tool, args) from commands where hash is null")
+
+                # the first command of a hash no command has yet keeps it
+                cursor.execute(
+                    """
+                    update commands
+                    set hash = (select d.hash from dedupe d where d.id = commands.id)
+                    where id in (
+                        select min(d.id)
+                        from dedupe d
+                        where not exists (select 1 from commands c where c.hash = d.hash)
+                        group by d.hash
+                    )
+                    """
+                )
+
+                cursor.execute(
+                    """
+                    insert or ignore into command_tags (command_id, tag_id)
+                    select c.id, ct.tag_id
+                    from dedupe d
+                    join commands c on c.hash = d.hash and c.id != d.id
+                    join command_tags ct on ct.command_id = d.id
+                    """
+                )
+                tags_merged = cursor.rowcount
+
+                cursor.execute(
+                    """
+                    delete from commands
+                    where id in (
+                        select d.id
+                        from dedupe d
+                        join commands c on c.hash = d.hash and c.id != d.id
+                    )
+                    """
+                )
+                merged = cursor.rowcount
+
+                cursor.execute("drop table temp.dedupe")
+
+        self.query_cache.clear()
+        self.catalog.touch(self.is_on())
+        self._drop_indexes("id", "tool")
+
+        return {"merged": merged, "tags_merged": tags_merged}
+
+    # > sheets
+    def list_sheets(self) -> dict:
+        """Get the sheets of the vault with their metadata
+
+        Returns:
+            dict: sheet name -> {size (bytes), modified (timestamp), commands, tags}
+        """
+        return self.catalog.entries()
 
     # checks if a DB is selected and can therefore operate
     def is_on(self) -> str:
@@ -391,22 +1091,47 @@ class DatabaseManager:
         """
         return None if not self.database_path else self.database_path.stem
 
+    # > exit
+    def close(self):
+        """Close the connection to the active sheet (if any) and to parked sheets."""
+        self._disconnect()
+
+        for state in self.parked.values():
+            if state["connection"]:
+                state["connection"].close()
+        self.parked.clear()
+
     # connects to db
     def _connect(self):
         """Closes existing connection (if any) and connect to new database.
-
-        Args:
-            database (str): database name (not path)
+        The connection is tuned once with the pragmas from the settings file
+        and reused by every session until the sheet changes.
         """
-        if self.connection:
-            self.connection.close()
+        self._disconnect()
 
         if not self.database_path:
             cli.cout(f"No database selected", cli.MsgType.FATAL_ERROR)
             raise ValueError
 
-        self.connection = sqlite3.connect(self.database_path)
+        self.connection = connect(self.database_path)
         self.connection.row_factory = sqlite3.Row
+        self.search_ready = False
+        self._drop_indexes()
+        self.query_cache.clear()
+        self.data_version = None
+        self.snapshot = None
+        self._apply_pragmas(self.connection)
+
+    # tunes a connection, pragmas are not parametrisable but are validated by settings
+    @staticmethod
+    def _apply_pragmas(conn: sqlite3.Connection, config=settings):
+        """Apply connection pragmas defined in settings (or config)."""
+        conn.execute("PRAGMA foreign_keys = ON")
+        conn.execute(f"PRAGMA journal_mode = {config.journal_mode}")
+        conn.execute(f"PRAGMA synchronous = {config.synchronous}")
+        conn.execute(f"PRAGMA cache_size = {config.cache_size}")
+        conn.execute(f"PRAGMA temp_store = {config.temp_store}")
+        conn.create_function("content_hash", 2, content_hash, deterministic=True)
 
     # disconnects from
     def _disconnect(self):
@@ -415,13 +1140,390 @@ class DatabaseManager:
             self.connection.close()
             self.connection = None
 
+    # the persistent connection is reused, a closed handle is replaced before use and
+    # one found broken by a query (see BROKEN_CONNECTION_ERRORS) by the next session
     @contextmanager
     def session(self):
-        self._connect()
+        if self.connection and not _is_open(self.connection):
+            self.connection = None
+        if not self.connection:
+            self._connect()
+
+        conn = self.connection
+        self.sessions += 1
         try:
-            yield self.connection
+            yield conn
+        except sqlite3.DatabaseError as e:
+            if self.connection is conn and (not _is_open(conn) or _is_broken(e)):
+                self.connection = None
+                self.dropped = conn
+            raise
         finally:
-            self._disconnect()
+            self.sessions -= 1
+            # enclosing `with conn` blocks have rolled back by now
+            if not self.sessions and self.dropped:
+                self.dropped.close()
+                self.dropped = None
+
+    # read-through cache, writes of this process clear it and writes of others bump data_version
+    def _cached(self, key: tuple, select, from_snapshot=None):
+        """Get a query result from the cache, running select on a miss.
+        PRAGMA data_version changes when another connection commits to the
+        sheet, so cached results (and name indexes) are dropped then.
+
+        Args:
+            key: cache key of the query
+            select: function running the query on a connection
+            from_snapshot: function answering the query from the snapshot, used instead of select with SNAPSHOT ON
+
+        Returns:
+            result of select(conn)
+        """
+        with self.session() as conn:
+            self._check_data_version(conn)
+
+            result = self.query_cache.get(key)
+            if result is MISS:
+                snapshot = from_snapshot and self._fresh_snapshot(conn)
+                result = from_snapshot(snapshot) if snapshot else select(conn)
+                self.query_cache.put(key, result)
+
+        return result
+
+    # > <sheet> with SNAPSHOT ON
+    @timed
+    def _load_snapshot(self):
+        """Load the active sheet in memory (see Snapshot) if SNAPSHOT is ON."""
+        if settings.snapshot != "ON":
+            return
+
+        from utils.snapshot import Snapshot
+
+        with self.session() as conn:
+            conn.execute("BEGIN")  # one read transaction, so no commit lands halfway
+            try:
+                self.snapshot = Snapshot(conn)
+            finally:
+                conn.rollback()
+
+    def _fresh_snapshot(self, conn: sqlite3.Connection):
+        """Get the snapshot of the active sheet, loaded again if the sheet changed since.
+
+        Returns:
+            Snapshot: the snapshot, None if SNAPSHOT is OFF
+        """
+        if settings.snapshot != "ON":
+            return None
+
+        if not self._snapshot_is_fresh(conn):
+            self._load_snapshot()
+
+        return self.snapshot
+
+    # writes of this connection change total_changes, writes of others data_version
+    def _snapshot_is_fresh(self, conn: sqlite3.Connection) -> bool:
+        return (
+            self.snapshot is not None
+            and self.snapshot.changes == conn.total_changes
+            and self.snapshot.data_version == conn.execute("PRAGMA data_version").fetchone()[0]
+        )
+
+    def _check_data_version(self, conn: sqlite3.Connection):
+        """Drop cached results and name indexes if another connection changed the sheet."""
+        version = conn.execute("PRAGMA data_version").fetchone()[0]
+        if version != self.data_version:
+            self.query_cache.clear()
+            self._drop_indexes()
+            if self.data_version is not None:
+                self.catalog.touch(self.is_on())
+            self.data_version = version
+
+    # builds the full-text index the first time a sheet is searched
+    def _ensure_search_index(self):
+        """Create and populate the full-text index if the active sheet lacks it."""
+        if self.search_ready:
+            return
+
+        with self.session() as conn:
+            self._create_search_index(conn)
+
+        self.search_ready = True
+
+    @staticmethod
+    def _create_search_index(conn: sqlite3.Connection):
+        """Create and populate the full-text index if the sheet lacks it.
+        Sheets created from older schemas get it on their first search.
+
+        Args:
+            conn: connection to the sheet
+        """
+        exists = conn.execute(
+            "select 1 from sqlite_master where name = 'commands_fts'"
+        ).fetchone()
+
+        if not exists:
+            search_sql = (SCHEMAS_PATH / "search.sql").read_text(encoding="utf-8")
+            with conn:
+                conn.executescript(search_sql)
+                conn.execute("insert into commands_fts (commands_fts) values ('rebuild')")
+
+    # runs a query on every sheet of the vault, each sheet on its own connection
+    def _query_vault(self, query, *args) -> dict:
+        """Run query on every sheet in parallel (bounded by VAULT_WORKERS).
+
+        Args:
+            query: function taking a connection followed by args
+            args: arguments for query
+
+        Returns:
+            dict: non-empty results of query by sheet name, sorted by sheet
+        """
+
+        def query_sheet(sheet: Path):
+            conn = connect(sheet)
+            conn.row_factory = sqlite3.Row
+            try:
+                return sheet.stem, query(conn, *args)
+            except sqlite3.Error:
+                return sheet.stem, sqlite3.Error
+            finally:
+                conn.close()
+
+        from concurrent.futures import ThreadPoolExecutor  # imports logging, only needed here
+
+        sheets = self.list_databases()
+        if not sheets:
+            return {}
+
+        with ThreadPoolExecutor(max_workers=min(VAULT_WORKERS, len(sheets))) as pool:
+            results = sorted(pool.map(query_sheet, sheets), key=lambda result: result[0])
+
+        failed = [sheet for sheet, result in results if result is sqlite3.Error]
+        if failed:
+            cli.cout(f"Could not query sheets: {', '.join(failed)}", cli.MsgType.WARNING)
+
+        return {sheet: result for sheet, result in results if result and result is not sqlite3.Error}
+
+    # one page of commands in (tool, id) order after key
+    def _select_commands_page(self, key: tuple, offset: int, size: int) -> list:
+        """Get a page of commands ordered by (tool, id)
+
+        Args:
+            key: (tool, id) of the last command of the previous page, or None
+            offset: number of commands to skip (only used without key)
+            size: maximum number of commands
+
+        Returns:
+            list: commands in the page
+        """
+        columns = "select c.id, c.tool, c.args, c.desc from commands c"
+
+        with self.session() as conn:
+            snapshot = self._fresh_snapshot(conn)
+            if snapshot:
+                return snapshot.page(key, offset, size)
+
+            if not key:
+                return conn.execute(
+                    f"{columns} order by c.tool, c.id limit ? offset ?", (size, offset)
+                ).fetchall()
+
+            # split in two seeks, sqlite cannot seek a (tool, id) row value on idx_commands_tool
+            tool, id = key
+            entries = conn.execute(
+                f"{columns} where c.tool = ? and c.id > ? order by c.id limit ?",
+                (tool, id, size),
+            ).fetchall()
+
+            if len(entries) < size:
+                entries += conn.execute(
+                    f"{columns} where c.tool > ? order by c.tool, c.id limit ?",
+                    (tool, size - len(entries)),
+                ).fetchall()
+
+        return entries
+
+    @staticmethod
+    def _select_commands_by_tool(conn: sqlite3.Connection, tool: str) -> list:
+        cursor = conn.cursor()
+
+        cursor.execute(
+            """
+            select c.id, c.tool, c.args, c.desc
+            from commands c
+            where c.tool = ?
+            """,
+            (tool,),
+        )
+
+        commands = cursor.fetchall()
+
+        return [dict(command) for command in commands]
+
+    @staticmethod
+    def _select_commands_by_tags(
+        conn: sqlite3.Connection, tags: list, required: list = (), excluded: list = ()
+    ) -> tuple[list, list]:
+        # kind of each tag, bound as one json object so any number of tags takes 1 variable
+        kinds = {**dict.fromkeys(tags, 0), **dict.fromkeys(required, 1), **dict.fromkeys(excluded, 2)}
+        kind_counts = [list(kinds.values()).count(kind) for kind in (0, 1)]
+
+        # each command is grouped once: it must have no excluded tag (kind 2),
+        # every required tag (kind 1) and, if any were given, one of tags (kind 0)
+        cursor = conn.cursor()
+        cursor.row_factory = None  # rows are turned into dicts below, skip sqlite3.Row
+        cursor.execute(
+            """
+            with wanted (tag_id, tag, kind) as (
+                select t.id, t.tag, q.value
+                from json_each(:query) q
+                join tags t on t.tag = q.key
+            ),
+            matched (command_id, tags) as (
+                select ct.command_id, group_concat(w.tag, ' ') filter (where w.kind < 2)
+                from wanted w
+                join command_tags ct on ct.tag_id = w.tag_id
+                group by ct.command_id
+                having max(w.kind) < 2
+                    and sum(w.kind) = :required_count
+                    and (:tags_count = 0 or count(*) > :required_count)
+            )
+            select c.id, c.tool, c.args, c.desc, m.tags
+            from matched m
+            join commands c on c.id = m.command_id
+            order by c.tool, c.id
+            """,
+            {"query": json.dumps(kinds), "tags_count": kind_counts[0], "required_count": kind_counts[1]},
+        )
+
+        commands = [
+            {"id": id, "tool": tool, "args": args, "desc": desc, "tags": sorted(matched.split())}
+            for id, tool, args, desc, matched in cursor
+        ]
+
+        known = {
+            row[0]
+            for row in conn.execute(
+                "select tag from tags where tag in (select key from json_each(?))", (json.dumps(kinds),)
+            )
+        }
+
+        return commands, [tag for tag in kinds if tag not in known]
+
+    @staticmethod
+    def _select_search(conn: sqlite3.Connection, query: str, limit: int) -> list:
+        cursor = conn.cursor()
+        cursor.execute(
+            """
+            select
+                f.rowid as id,
+                coalesce(highlight(commands_fts, 0, ?, ?), '') as tool,
+                coalesce(highlight(commands_fts, 1, ?, ?), '') as args,
+                coalesce(snippet(commands_fts, 2, ?, ?, '...', 16), '') as desc
+            from commands_fts f
+            where commands_fts match ?
+            order by bm25(commands_fts, 10.0, 5.0, 1.0)
+            limit ?
+            """,
+            (*SEARCH_MARKS, *SEARCH_MARKS, *SEARCH_MARKS, query, limit),
+        )
+
+        return cursor.fetchall()
+
+    # builds the trigram index of tags or tools the first time it is needed
+    def _fuzzy_index(self, kind: str) -> TrigramIndex:
+        """Get the trigram index of tags or tools of the active sheet
+
+        Args:
+            kind: 'tag' or 'tool'
+
+        Returns:
+            TrigramIndex: index over the distinct names of kind
+        """
+        with self.session() as conn:
+            self._check_data_version(conn)
+
+        if kind not in self.fuzzy_indexes:
+            self.fuzzy_indexes[kind] = TrigramIndex(self._names(kind))
+
+        return self.fuzzy_indexes[kind]
+
+    # the vault directory changes mtime when a sheet is created or removed
+    def _sheet_index(self) -> PrefixIndex:
+        """Get the prefix index of sheet names in the vault
+
+        Returns:
+            PrefixIndex: index over sheet names, rebuilt if the catalog changed
+        """
+        names = self.catalog.names()
+        if self.sheet_index[0] != names:
+            self.sheet_index = (names, PrefixIndex(names))
+
+        return self.sheet_index[1]
+
+    # builds the prefix index of tags, tools or ids the first time it is needed
+    def _prefix_index(self, kind: str) -> PrefixIndex:
+        """Get the prefix index of tags, tools or ids of the active sheet
+
+        Args:
+            kind: 'tag', 'tool' or 'id'
+
+        Returns:
+            PrefixIndex: index over the distinct names of kind
+        """
+        with self.session() as conn:
+            self._check_data_version(conn)
+
+        if kind not in self.prefix_indexes:
+            self.prefix_indexes[kind] = PrefixIndex(self._names(kind))
+
+        return self.prefix_indexes[kind]
+
+    def _names(self, kind: str):
+        if kind == "tag":
+            return (row["tag"] for row in self.get_tags())
+        if kind == "tool":
+            return (row["tool"] for row in self.get_tools())
+
+        with self.session() as conn:
+            return [str(row[0]) for row in conn.execute("select id from commands")]
+
+    # keeps already built name indexes up to date after inserts
+    def _index_add(self, kind: str, names: list):
+        for indexes in (self.fuzzy_indexes, self.prefix_indexes):
+            index = indexes.get(kind)
+            if index is not None:
+                for name in names:
+                    index.add(name)
+
+    # name indexes are rebuilt on next use, all of them if no kind is given
+    def _drop_indexes(self, *kinds: str):
+        for indexes in (self.fuzzy_indexes, self.prefix_indexes):
+            if not kinds:
+                indexes.clear()
+            for kind in kinds:
+                indexes.pop(kind, None)
+
+    # turns user terms into a safe fts5 query
+    @staticmethod
+    def _fts_query(terms: list) -> str:
+        """Quote search terms so user input is never parsed as fts5 syntax.
+
+        Args:
+            terms: list of terms. Trailing '*' marks a prefix term.
+
+        Returns:
+            str: fts5 query matching all terms
+        """
+        parts = []
+        for term in terms:
+            prefix = term.endswith("*")
+            term = term.rstrip("*").replace('"', '""')
+            if not term.strip():
+                continue
+            parts.append(f'"{term}"*' if prefix else f'"{term}"')
+
+        return " ".join(parts)
 
     # creates DB from schema
     def _execute_schema(self):
@@ -439,16 +1541,273 @@ class DatabaseManager:
             with conn:
                 conn.cursor().executescript(schema_sql)
 
-    # > create <sheet>
+    # upgrades the sheet to the latest schema version
+    def _migrate(self):
+        """Apply pending migrations in self.migrations_path.
+        Migrations are named <version>_<name>.sql and the version of a sheet
+        is kept in PRAGMA user_version. Each migration runs in its own
+        transaction together with the version bump, unless its first line
+        is NO_TRANSACTION.
+        """
+        with self.session() as conn:
+            version = conn.execute("PRAGMA user_version").fetchone()[0]
+
+            for migration in sorted(self.migrations_path.glob("*.sql")):
+                target = int(migration.stem.split("_", 1)[0])
+                if target <= version:
+                    continue
+
+                migration_sql = migration.read_text(encoding="utf-8")
+
+                try:
+                    if migration_sql.startswith(NO_TRANSACTION):
+                        # cannot hold the lock, these migrations are safe to run twice
+                        conn.executescript(f"{migration_sql}\nPRAGMA user_version = {target};")
+                    else:
+                        self._apply_migration(conn, migration_sql, target)
+                except sqlite3.Error:
+                    if conn.in_transaction:
+                        conn.rollback()
+                    cli.cout(
+                        f"Error: could not apply migration '{migration.name}'",
+                        cli.MsgType.FATAL_ERROR,
+                    )
+                    raise
+
+                version = target
+
+    @staticmethod
+    def _apply_migration(conn: sqlite3.Connection, migration_sql: str, target: int):
+        """Run a migration and bump user_version to target in one write
+        transaction, unless another process applied it while this one waited
+        for the lock. Statements run one by one: executescript would commit
+        the transaction first. Search triggers a migration dropped are
+        created again from search.sql, on sheets with the full-text index.
+        """
+        conn.execute("BEGIN IMMEDIATE")
+        if conn.execute("PRAGMA user_version").fetchone()[0] >= target:
+            conn.rollback()
+            return
+
+        for statement in _statements(migration_sql):
+            conn.execute(statement)
+
+        if conn.execute("select 1 from sqlite_master where name = 'commands_fts'").fetchone():
+            search_sql = (SCHEMAS_PATH / "search.sql").read_text(encoding="utf-8")
+            for statement in _statements(search_sql):  # IF NOT EXISTS, only what is missing
+                conn.execute(statement)
+
+        conn.execute(f"PRAGMA user_version = {target}")
+        conn.commit()
+
+    # commands matched by rm and retag predicates, as (where condition, executemany params)
+    @staticmethod
+    def _selections(ranges: list = (), tools: list = (), tags: list = ()):
+        """Turn id ranges, tools and tags into where conditions on commands.
+        Ranges become BETWEEN and single ids IN lists of MAX_VARIABLES.
+
+        Yields:
+            tuple: condition on commands and its list of parameter tuples
+        """
+        spans = [(start, end) for start, end in ranges if start != end]
+        singles = [start for start, end in ranges if start == end]
+
+        if spans:
+            yield "id between ? and ?", spans
+
+        for at in range(0, len(singles), MAX_VARIABLES):
+            chunk = singles[at : at + MAX_VARIABLES]
+            yield f"id in ({', '.join('?' * len(chunk))})", [chunk]
+
+        if tools:
+            yield "tool = ?", [(tool,) for tool in tools]
+
+        if tags:
+            yield (
+                """
+                id in (
+                    select ct.command_id
+                    from command_tags ct
+                    join tags t on t.id = ct.tag_id
+                    where t.tag = ?
+                )
+                """,
+                [(tag,) for tag in tags],
+            )
+
+    def _add_tags(self, cursor: sqlite3.Cursor, selection: list, tags: list) -> int:
+        """Link tags (created if missing) to the commands of selection (see _selections).
+
+        Returns:
+            int: number of links added
+        """
+        if not tags:
+            return 0
+
+        tag_ids = json.dumps(list(self._resolve_tag_ids(cursor, tags).values()))
+        added = 0
+
+        for condition, params in selection:
+            cursor.executemany(
+                f"""
+                insert or ignore into command_tags (command_id, tag_id)
+                select c.id, t.value
+                from (select id from commands where {condition}) c, json_each(?) t
+                """,
+                [(*param, tag_ids) for param in params],
+            )
+            added += cursor.rowcount
+
+        return added
+
+    @staticmethod
+    def _remove_tags(cursor: sqlite3.Cursor, selection: list, tags: list) -> int:
+        """Unlink tags from the commands of selection (see _selections).
+
+        Returns:
+            int: number of links removed
+        """
+        if not tags:
+            return 0
+
+        removed = 0
+
+        for condition, params in selection:
+            cursor.executemany(
+                f"""
+                delete from command_tags
+                where tag_id in (select id from tags where tag in (select value from json_each(?)))
+                and command_id in (select id from commands where {condition})
+                """,
+                [(json.dumps(list(tags)), *param) for param in params],
+            )
+            removed += cursor.rowcount
+
+        return removed
+
+    # updates fields of a command and its content hash within the caller's transaction
+    @staticmethod
+    def _update_fields(cursor: sqlite3.Cursor, command_id: int, updates: dict) -> int:
+        """Update fields of a command, and its hash if tool or args changed.
+        Values on the right of SET are the old ones, so new tool and args
+        are bound (coalesce keeps the old value of the one not updated).
+
+        Raises:
+            sqlite3.IntegrityError: the command would duplicate another one (see find_duplicate)
+
+        Returns:
+            int: number of commands updated
+        """
+        placeholders = ", ".join(f"{key} = :{key}" for key in updates)
+        if "tool" in updates or "args" in updates:
+            placeholders += ", hash = content_hash(coalesce(:new_tool, tool), coalesce(:new_args, args))"
+
+        cursor.execute(
+            f"update commands set {placeholders} where id = :id",
+            {**updates, "new_tool": updates.get("tool"), "new_args": updates.get("args"), "id": command_id},
+        )
+
+        return cursor.rowcount
+
+    # ids of the commands with the given hashes, one index seek each
+    @staticmethod
+    def _ids_by_hash(cursor: sqlite3.Cursor, hashes: list) -> dict:
+        ids = {}
+
+        for start in range(0, len(hashes), MAX_VARIABLES):
+            batch = hashes[start : start + MAX_VARIABLES]
+            cursor.execute(f"select hash, id from commands where hash in ({', '.join('?' * len(batch))})", batch)
+            ids.update((row[0], row[1]) for row in cursor.fetchall())
+
+        return ids
+
+    # inserts tags and links them to a command within the caller's transaction
+    def _insert_tags(self, cursor: sqlite3.Cursor, command_id: int, tags: list):
+        """Insert missing tags and associate them to a command
+
+        Args:
+            cursor: cursor of an open transaction
+            command_id: id of the command
+            tags: list of tags (not tag ids)
+        """
+        tag_ids = self._resolve_tag_ids(cursor, tags)
+
+        cursor.executemany(  # insert command_id and tag ids in joint table
+            """
+            insert or ignore into command_tags
+            values (?, ?)
+            """,
+            [(command_id, tag_id) for tag_id in tag_ids.values()],
+        )
+
+    # inserts missing tags and maps every tag to its id within the caller's transaction
+    def _resolve_tag_ids(self, cursor: sqlite3.Cursor, tags) -> dict:
+        """Insert missing tags and get the ids of all of them
+
+        Args:
+            cursor: cursor of an open transaction
+            tags: iterable of tags (not tag ids)
+
+        Returns:
+            dict: tag ids by tag
+        """
+        tags = list(dict.fromkeys(tags))
+
+        cursor.executemany(  # insert tags in case there are new tags
+            """
+            insert or ignore into tags (tag)
+            values (?)
+            """,
+            [(tag,) for tag in tags],
+        )
+
+        tag_ids = {}
+        for start in range(0, len(tags), MAX_VARIABLES):  # stay under sqlite's variable limit
+            batch = tags[start : start + MAX_VARIABLES]
+            placeholders = ", ".join("?" * len(batch))
+            cursor.execute(  # select ids of tags to later insert in joint table
+                f"""
+                select id, tag
+                from tags
+                where tag in ({placeholders})
+                """,
+                batch,
+            )
+            tag_ids.update((row["tag"], row["id"]) for row in cursor.fetchall())
+
+        return tag_ids
+
+    # unknown names are rejected from the catalog, without looking at the vault
     def _database_exists(self, database: str):
-        tmp = self.vault_path / f"{database}.db"
-        return tmp.exists()
+        return database in self.catalog and (self.vault_path / f"{database}.db").exists()
+
+
+# statements of an sql script, for running it inside a transaction (executescript commits first)
+def _statements(script: str):
+    statement = ""
+    for line in script.splitlines(keepends=True):
+        statement += line
+        if sqlite3.complete_statement(statement):
+            yield statement
+            statement = ""
+
+
+def _is_open(conn: sqlite3.Connection) -> bool:
+    try:
+        conn.total_changes  # no query, raises once the handle is closed
+    except sqlite3.ProgrammingError:
+        return False
+    return True
+
+
+def _is_broken(error: sqlite3.DatabaseError) -> bool:
+    return (getattr(error, "sqlite_errorname", None) or "").startswith(BROKEN_CONNECTION_ERRORS)
 
 
 def requires_db(func):
     @wraps(func)
     def wrapper(*args, **kwargs):
-        if not db_manager.is_on():
+        if not DatabaseManager().is_on():  # the singleton
             cli.cout("Please select a sheet", cli.MsgType.BAD_INPUT)
             return
         return func(*args, **kwargs)
@@ -456,4 +1815,10 @@ def requires_db(func):
     return wrapper
 
 
-db_manager = DatabaseManager()
+# the singleton is built on first import of db_manager, so importing DatabaseManager does not read the settings
+def __getattr__(name):
+    if name == "db_manager":
+        global db_manager
+        db_manager = DatabaseManager()
+        return db_manager
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,94 @@
+from bisect import bisect_left
+from collections import defaultdict
+
+
+class TrigramIndex:
+    """In-memory trigram index over a set of names (tags or tools).
+    Resolves near-misses ('apktol' -> 'apktool') by trigram similarity.
+    """
+
+    def __init__(self, names: list, threshold: float = 0.3):
+        self.threshold = threshold
+        self.names = []
+        self.known = set()
+        self.grams = []
+        self.postings = defaultdict(list)
+
+        for name in names:
+            self.add(name)
+
+    def add(self, name: str):
+        """Index a name. Names already indexed are ignored.
+
+        Args:
+            name: tag or tool name
+        """
+        if name in self.known:
+            return
+
+        index = len(self.names)
+        grams = _trigrams(name)
+        self.names.append(name)
+        self.known.add(name)
+        self.grams.append(len(grams))
+        for gram in grams:
+            self.postings[gram].append(index)
+
+    def lookup(self, word: str, limit: int = 3) -> list:
+        """Get the names most similar to word
+
+        Args:
+            word: misspelled name
+            limit: maximum number of names returned
+
+        Returns:
+            list: names with similarity above threshold, most similar first
+        """
+        grams = _trigrams(word)
+        if not grams:
+            return []
+
+        # a name sharing fewer than min_shared trigrams cannot reach the threshold,
+        # so only the rarest trigrams need to be scanned to find every candidate
+        min_shared = max(1, int(self.threshold * len(grams) + 0.999))
+        by_rarity = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+        probe, rest = by_rarity[: len(grams) - min_shared + 1], by_rarity[len(grams) - min_shared + 1 :]
+
+        shared = defaultdict(int)
+        for gram in probe:
+            for index in self.postings.get(gram, ()):
+                shared[index] += 1
+
+        if not shared:
+            return []
+
+        rest = [self.postings[gram] for gram in rest if gram in self.postings]
+
+        # similarity can only reach the threshold between these trigram counts
+        shortest, longest = self.threshold * len(grams), len(grams) / self.threshold
+
+        scored = []
+        for index, count in shared.items():
+            if not shortest <= self.grams[index] <= longest:
+                continue
+            best = count + len(rest)  # as if the name had every remaining trigram
+            if best / (len(grams) + self.grams[index] - best) < self.threshold:
+                continue
+            count += sum(1 for posting in rest if _contains(posting, index))
+            similarity = count / (len(grams) + self.grams[index] - count)
+            if similarity >= self.threshold:
+                scored.append((-similarity, self.names[index]))
+
+        scored.sort()
+        return [name for _, name in scored[:limit]]
+
+
+# postings are sorted because names are indexed in insertion order
+def _contains(posting: list, index: int) -> bool:
+    i = bisect_left(posting, index)
+    return i < len(posting) and posting[i] == index
+
+
+def _trigrams(word: str) -> set:
+    word = f"  {word.lower()} "
+    return {word[i : i + 3] for i in range(len(word) - 2)}
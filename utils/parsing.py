@@ -0,0 +1,59 @@
+from ui import prettier_cli as cli
+
+
+def is_word(value) -> bool:
+    """Check that value is a str of exactly one word (tool and tag names)."""
+    return isinstance(value, str) and len(value.split()) == 1
+
+
+# > rm and retag selections: <id> <id>-<id> tool:<tool> tag:<tag> ...
+def parse_query(string: str):
+    """Split a selection of commands into id ranges, tools and tags
+
+    Returns:
+        tuple: (ranges, tools, tags), ranges as merged (first, last) tuples.
+            False if an argument is invalid
+    """
+    ranges, tools, tags = [], [], []
+
+    for part in string.split():
+        kind, _, name = part.partition(":")
+
+        if name and kind == "tool":
+            tools.append(name)
+            continue
+        if name and kind == "tag":
+            tags.append(name)
+            continue
+
+        if "-" in part:
+            start_str, end_str = part.split("-", maxsplit=1)
+        else:
+            start_str = end_str = part
+        if not start_str.isdigit() or not end_str.isdigit():
+            return _bad_range_msg(part)
+        start, end = int(start_str), int(end_str)
+        if start > end:
+            return _bad_range_msg(part)
+        ranges.append((start, end))
+
+    return _merge(ranges), tools, tags
+
+
+# overlapping or adjacent ranges become one, so requested ids are counted once
+def _merge(ranges: list) -> list:
+    merged = []
+
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+
+    return merged
+
+
+def _bad_range_msg(part: str):
+    msg = f"\nError: invalid id '{part}'. Specify <int>, <int>-<int>, tool:<tool> or tag:<tag>."
+    cli.cout(msg, cli.MsgType.BAD_INPUT)
+    return False
@@ -0,0 +1,40 @@
+from bisect import bisect_left
+
+
+class PrefixIndex:
+    """Sorted array of names (tags, tools, ids or sheets).
+    Names starting with a prefix are found by bisection, so completing
+    costs O(log n) plus the matches returned.
+    """
+
+    def __init__(self, names):
+        self.names = sorted(set(names))
+
+    def add(self, name: str):
+        """Insert a name in order. Names already indexed are ignored.
+
+        Args:
+            name: name to index
+        """
+        i = bisect_left(self.names, name)
+        if i == len(self.names) or self.names[i] != name:
+            self.names.insert(i, name)
+
+    def complete(self, prefix: str, limit: int = 100) -> list:
+        """Get the names starting with prefix
+
+        Args:
+            prefix: beginning of the name
+            limit: maximum number of names returned
+
+        Returns:
+            list: matching names in order
+        """
+        matches = []
+
+        for i in range(bisect_left(self.names, prefix), len(self.names)):
+            if len(matches) == limit or not self.names[i].startswith(prefix):
+                break
+            matches.append(self.names[i])
+
+        return matches
@@ -1,27 +1,64 @@
-import json
 import sys
 
 from pathlib import Path
-from os.path import expandvars
+from types import SimpleNamespace
+from os.path import expanduser, expandvars
 
 from ui import prettier_cli as cli
 
 
+# accepted values of variables holding a file path, kept as written (not upper-cased)
+PATH = "path"
+
+# optional variables: name -> (attribute, default value, accepted values)
+# accepted values of None means any integer
+OPTIONAL_VARIABLES = {
+    "JOURNAL_MODE": ("journal_mode", "WAL", {"DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL"}),
+    "SYNCHRONOUS": ("synchronous", "NORMAL", {"OFF", "NORMAL", "FULL", "EXTRA"}),
+    "CACHE_SIZE": ("cache_size", "-8000", None),
+    "TEMP_STORE": ("temp_store", "MEMORY", {"DEFAULT", "FILE", "MEMORY"}),
+    "PAGE_SIZE": ("page_size", "50", None),
+    "STATS": ("stats", "OFF", {"ON", "OFF"}),
+    "SLOW_QUERY_MS": ("slow_query_ms", "100", None),
+    "SLOW_QUERY_LOG": ("slow_query_log", "", PATH),
+    "DAEMON_IDLE": ("daemon_idle", "900", None),
+    "MAINTAIN_ON_EXIT": ("maintain_on_exit", "ON", {"ON", "OFF"}),
+    "SNAPSHOT": ("snapshot", "OFF", {"ON", "OFF"}),
+    "CLIPBOARD": ("clipboard", "AUTO", {"AUTO", "OSC52", "PBCOPY", "WL-COPY", "XCLIP", "XSEL", "PYPERCLIP"}),
+}
+
+
+# values of the optional variables without a settings file, for embedded use with an explicit vault
+DEFAULTS = SimpleNamespace(**{attr: default for attr, default, _ in OPTIONAL_VARIABLES.values()})
+
+
+def settings_path() -> Path:
+    return Path(expandvars("$HOME/.config/cheetah/settings"))
+
+
 class SettingsManager:
     _instance = None
+    _loaded = False
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(SettingsManager, cls).__new__(cls)
-            cls._load()
         return cls._instance
 
+    # the settings file is read (or set up) on first use, not on import
+    def __getattr__(self, name):
+        if name.startswith("_") or SettingsManager._loaded:
+            raise AttributeError(name)
+        SettingsManager._loaded = True
+        self._load()
+        return getattr(self, name)
+
     def switch_sheets(self, new_sheet):
         self.active_sheet = new_sheet or self.active_sheet
 
     @classmethod
     def _load(cls):
-        default_settings = Path(expandvars("$HOME/.config/cheetah/settings"))
+        default_settings = settings_path()
 
         if not default_settings.exists():
             cli.cout("\nNo settings file found in '.config/cheetah/setting'. You will proceed with the setup.")
@@ -45,5 +82,21 @@ class SettingsManager:
         cls._instance.vault_path = expandvars(variables["VAULT"])
         cls._instance.active_sheet = "ICheetah"
 
+        for key, (attr, default, accepted) in OPTIONAL_VARIABLES.items():
+            value = variables.get(key, default)
+            value = expanduser(expandvars(value)) if accepted == PATH else value.upper()
+            if not _valid_value(value, accepted):
+                cli.cout(f"\nInvalid value for {key} in .config/cheetah/settings: {value}.", cli.MsgType.FATAL_ERROR)
+                sys.exit(1)
+            setattr(cls._instance, attr, value)
+
+
+def _valid_value(value: str, accepted: set) -> bool:
+    if accepted is None:
+        return value.lstrip("-").isdigit()
+    if accepted == PATH:
+        return True
+    return value in accepted
+
 
 settings = SettingsManager()
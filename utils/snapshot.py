@@ -0,0 +1,191 @@
+import sqlite3
+import sys
+
+from array import array
+from bisect import bisect_left, bisect_right
+
+
+class Snapshot:
+    """Read-only copy of a sheet in memory, answering tool, tag, id and
+    page queries without SQLite.
+
+    Commands are kept in parallel arrays indexed by position, in id order:
+    ids (int64), tool numbers (uint32), args and descs. Tool numbers follow
+    the sorted tool names, so `order` (positions sorted by tool then id)
+    holds each tool's commands as one sorted run starting at tool_starts.
+    Tags map to posting lists of positions (sorted uint32 arrays). Tool
+    and tag names are interned, so each is stored once.
+
+    Commands added by this process are taken in place (see add), any other
+    write makes DatabaseManager load the snapshot again on next use.
+    """
+
+    def __init__(self, conn: sqlite3.Connection):
+        cursor = conn.cursor()
+        cursor.row_factory = None
+
+        self.tool_names = [
+            sys.intern(tool) for tool, in cursor.execute("select distinct tool from commands order by tool")
+        ]
+        self.tool_numbers = {tool: number for number, tool in enumerate(self.tool_names)}
+
+        self.ids = array("q")
+        self.tools = array("I")
+        self.args = []
+        self.descs = []
+
+        for id, tool, args, desc in cursor.execute("select id, tool, args, desc from commands order by id"):
+            self.ids.append(id)
+            self.tools.append(self.tool_numbers[tool])
+            self.args.append(args)
+            self.descs.append(desc)
+
+        # positions grouped by tool, each group in id order
+        counts = [0] * len(self.tool_names)
+        for number in self.tools:
+            counts[number] += 1
+        self.tool_starts = array("I", [0])
+        for count in counts:
+            self.tool_starts.append(self.tool_starts[-1] + count)
+
+        self.order = array("I", bytes(4 * len(self.ids)))
+        next_slot = list(self.tool_starts[:-1])
+        for position, number in enumerate(self.tools):
+            self.order[next_slot[number]] = position
+            next_slot[number] += 1
+
+        # tags without commands still exist, with no postings
+        self.by_tag = {sys.intern(tag): array("I") for tag, in cursor.execute("select tag from tags")}
+        tag_postings = {id: self.by_tag[tag] for id, tag in cursor.execute("select id, tag from tags")}
+
+        # in command_id order (primary key) positions come in order, so postings end up sorted
+        position = 0
+        for command_id, tag_id in cursor.execute("select command_id, tag_id from command_tags order by command_id"):
+            while self.ids[position] < command_id:
+                position += 1
+            tag_postings[tag_id].append(position)
+
+        # state of the sheet it was loaded from, see DatabaseManager._snapshot_is_fresh
+        self.changes = conn.total_changes
+        self.data_version = conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def add(self, id: int, tool: str, args: str, desc: str, tags: list) -> bool:
+        """Add a command inserted in the sheet
+
+        Returns:
+            bool: False if the snapshot cannot take it in place (new tool, or
+                id not after the last one) and must be loaded again
+        """
+        number = self.tool_numbers.get(tool)
+        if number is None or (self.ids and id <= self.ids[-1]):
+            return False
+
+        position = len(self.ids)
+        self.ids.append(id)
+        self.tools.append(number)
+        self.args.append(args)
+        self.descs.append(desc)
+
+        self.order.insert(self.tool_starts[number + 1], position)
+        for following in range(number + 1, len(self.tool_starts)):
+            self.tool_starts[following] += 1
+
+        for tag in dict.fromkeys(tags):
+            postings = self.by_tag.get(tag)
+            if postings is None:
+                postings = self.by_tag[sys.intern(tag)] = array("I")
+            postings.append(position)
+
+        return True
+
+    def command(self, id: int) -> dict:
+        """Get a command by id, None if there is none."""
+        position = bisect_left(self.ids, id)
+        if position == len(self.ids) or self.ids[position] != id:
+            return None
+        return self._command(position)
+
+    def commands_by_tool(self, tool: str) -> list:
+        """Get the commands of a tool, in id order."""
+        number = self.tool_numbers.get(tool)
+        if number is None:
+            return []
+        return [self._command(position) for position in self._tool_run(number)]
+
+    def commands_by_tags(self, tags: list, required: list = (), excluded: list = ()) -> tuple[list, list]:
+        """Same result as DatabaseManager._select_commands_by_tags, by set
+        operations on the posting lists.
+        """
+        kinds = {**dict.fromkeys(tags, 0), **dict.fromkeys(required, 1), **dict.fromkeys(excluded, 2)}
+        missing = [tag for tag in kinds if tag not in self.by_tag]
+        wanted = [tag for tag, kind in kinds.items() if kind < 2 and tag in self.by_tag]
+        required = [tag for tag, kind in kinds.items() if kind == 1]
+        excluded = [tag for tag, kind in kinds.items() if kind == 2 and tag in self.by_tag]
+
+        if any(tag not in self.by_tag for tag in required):
+            return [], missing
+
+        # smallest posting lists first, so intersections shrink as fast as possible
+        if required:
+            required.sort(key=lambda tag: len(self.by_tag[tag]))
+            matches = set(self.by_tag[required[0]])
+            for tag in required[1:]:
+                matches.intersection_update(self.by_tag[tag])
+            if any(kind == 0 for kind in kinds.values()):
+                matches.intersection_update(
+                    position for tag, kind in kinds.items() if kind == 0 and tag in self.by_tag
+                    for position in self.by_tag[tag]
+                )
+        else:
+            matches = set()
+            for tag in wanted:
+                matches.update(self.by_tag[tag])
+
+        for tag in excluded:
+            matches.difference_update(self.by_tag[tag])
+
+        # matched tags of each command: required ones always are, tags only
+        # need checking when there are several of them
+        wanted.sort()
+        checks = None
+        if sum(kinds[tag] == 0 for tag in wanted) > 1:
+            checks = [(tag, None if kinds[tag] == 1 else set(self.by_tag[tag])) for tag in wanted]
+
+        commands = []
+
+        # positions follow ids, so a stable sort by tool gives (tool, id) order
+        for position in sorted(sorted(matches), key=self.tools.__getitem__):
+            command = self._command(position)
+            command["tags"] = (
+                [tag for tag, tagged in checks if tagged is None or position in tagged] if checks else list(wanted)
+            )
+            commands.append(command)
+
+        return commands, missing
+
+    def page(self, key: tuple, offset: int, size: int) -> list:
+        """Same page as DatabaseManager._select_commands_page, in (tool, id) order."""
+        start = offset
+        if key:
+            tool, id = key
+            number = bisect_right(self.tool_names, tool)  # first tool after it
+            start = self.tool_starts[number]
+            if number and self.tool_names[number - 1] == tool:
+                after = bisect_right(self.ids, id)
+                start = bisect_left(self.order, after, self.tool_starts[number - 1], start)
+
+        return [self._command(position) for position in self.order[start : start + size]]
+
+    def _tool_run(self, number: int):
+        return self.order[self.tool_starts[number] : self.tool_starts[number + 1]]
+
+    def _command(self, position: int) -> dict:
+        return {
+            "id": self.ids[position],
+            "tool": self.tool_names[self.tools[position]],
+            "args": self.args[position],
+            "desc": self.descs[position],
+        }
@@ -0,0 +1,282 @@
+import re
+import sqlite3
+import threading
+import time
+
+from collections import deque
+from functools import wraps
+from inspect import isgeneratorfunction
+
+
+# durations kept per operation or query, older ones are dropped
+SAMPLES = 1000
+
+# slow queries kept in memory for `stats slow`
+SLOW_QUERIES = 20
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+\b")
+_PLACEHOLDER_LISTS = re.compile(r"\?(?:\s*,\s*\?)+")
+_SPACES = re.compile(r"\s+")
+
+
+class Timings:
+    """Count, rows and the last SAMPLES durations of an operation or query."""
+
+    def __init__(self):
+        self.count = 0
+        self.rows = 0
+        self.samples = deque(maxlen=SAMPLES)
+
+    def add(self, seconds: float, rows: int = 0):
+        self.count += 1
+        self.rows += rows
+        self.samples.append(seconds)
+
+    def percentiles(self) -> dict:
+        """Get p50, p90, p99 and max of the kept durations, in milliseconds."""
+        samples = sorted(self.samples)
+        last = len(samples) - 1
+
+        def at(fraction):
+            return round(samples[round(last * fraction)] * 1000, 3)
+
+        return {"p50_ms": at(0.5), "p90_ms": at(0.9), "p99_ms": at(0.99), "max_ms": at(1)}
+
+
+class Stats:
+    """Timings of DatabaseManager operations, queries and connections.
+    Disabled, operations only check a flag and connections are not traced.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.slow_ms = 0
+        self.log_path = None
+        self.lock = threading.Lock()
+        self.reset()
+
+    def configure(self, enabled: bool, slow_ms: int = 0, log_path: str = None):
+        """Set up instrumentation
+
+        Args:
+            enabled: record timings
+            slow_ms: queries taking at least this long are logged with their plan (0 to never log)
+            log_path: file slow queries are appended to (kept in memory only if None)
+        """
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self.log_path = log_path
+
+    def reset(self):
+        with self.lock:
+            self.operations = {}
+            self.queries = {}
+            self.connections = Timings()
+            self.slow = deque(maxlen=SLOW_QUERIES)
+
+    def record_operation(self, name: str, seconds: float):
+        with self.lock:
+            self.operations.setdefault(name, Timings()).add(seconds)
+
+    def record_connection(self, seconds: float):
+        with self.lock:
+            self.connections.add(seconds)
+
+    def record_query(self, conn: sqlite3.Connection, sql: str, params, seconds: float, rows: int):
+        with self.lock:
+            self.queries.setdefault(fingerprint(sql), Timings()).add(seconds, rows)
+
+        if self.slow_ms and seconds * 1000 >= self.slow_ms:
+            self._log_slow(conn, sql, params, seconds, rows)
+
+    def _log_slow(self, conn: sqlite3.Connection, sql: str, params, seconds: float, rows: int):
+        entry = {
+            "time": time.strftime("%Y-%m-%d %H:%M:%S"),
+            "ms": round(seconds * 1000, 3),
+            "rows": rows,
+            "sql": _SPACES.sub(" ", sql).strip(),
+            "params": repr(params)[:200],
+            "plan": _query_plan(conn, sql, params),
+        }
+
+        with self.lock:
+            self.slow.append(entry)
+
+        if self.log_path:
+            plan = "".join(f"\n    {step}" for step in entry["plan"])
+            with open(self.log_path, "a", encoding="utf-8") as log:
+                log.write(f"{entry['time']} {entry['ms']} ms {rows} rows: {entry['sql']} {entry['params']}{plan}\n")
+
+
+# sql with literals and placeholder lists collapsed, so one query shape is one entry
+_fingerprints = {}
+
+
+def fingerprint(sql: str) -> str:
+    if sql not in _fingerprints:
+        if len(_fingerprints) > 1000:
+            _fingerprints.clear()
+        shape = _SPACES.sub(" ", sql).strip()
+        shape = _PLACEHOLDER_LISTS.sub("?, ...", _LITERALS.sub("?", shape))
+        _fingerprints[sql] = shape
+    return _fingerprints[sql]
+
+
+def _query_plan(conn: sqlite3.Connection, sql: str, params) -> list:
+    # a plain cursor, so explaining is not traced itself
+    try:
+        steps = sqlite3.Cursor(conn).execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    except (sqlite3.Error, ValueError):
+        return []
+    return [step[-1] for step in steps]
+
+
+class TracedCursor(sqlite3.Cursor):
+    """Cursor recording duration (execute and fetches) and rows of each query."""
+
+    _query = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        super().execute(sql, parameters)
+        self._query = [sql, parameters, time.perf_counter() - start, 0]
+        if self.description is None:  # nothing to fetch
+            self._finish()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        start = time.perf_counter()
+        super().executemany(sql, seq_of_parameters)
+        stats.record_query(self.connection, sql, (), time.perf_counter() - start, max(self.rowcount, 0))
+        return self
+
+    def executescript(self, sql_script):
+        self._finish()
+        start = time.perf_counter()
+        super().executescript(sql_script)
+        stats.record_query(self.connection, sql_script, (), time.perf_counter() - start, 0)
+        return self
+
+    def fetchone(self):
+        return self._fetched(super().fetchone, single=True)
+
+    def fetchmany(self, size=None):
+        return self._fetched(lambda: super(TracedCursor, self).fetchmany(size or self.arraysize))
+
+    def fetchall(self):
+        rows = self._fetched(super().fetchall)
+        self._finish()
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._finish()
+            raise
+        if self._query:
+            self._query[2] += time.perf_counter() - start
+            self._query[3] += 1
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def __del__(self):
+        self._finish()
+
+    def _fetched(self, fetch, single: bool = False):
+        start = time.perf_counter()
+        rows = fetch()
+        if self._query:
+            self._query[2] += time.perf_counter() - start
+            self._query[3] += (rows is not None) if single else len(rows)
+            if single and rows is None:
+                self._finish()
+        return rows
+
+    def _finish(self):
+        if self._query:
+            sql, params, seconds, rows = self._query
+            self._query = None
+            stats.record_query(self.connection, sql, params, seconds, rows)
+
+
+class TracedConnection(sqlite3.Connection):
+    """Connection whose queries go through TracedCursor."""
+
+    def cursor(self, factory=TracedCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def connect(database, **kwargs) -> sqlite3.Connection:
+    """sqlite3.connect, traced and timed while stats are enabled."""
+    if not stats.enabled:
+        return sqlite3.connect(database, **kwargs)
+
+    start = time.perf_counter()
+    conn = sqlite3.connect(database, factory=TracedConnection, **kwargs)
+    stats.record_connection(time.perf_counter() - start)
+    return conn
+
+
+def timed(func):
+    """Record the duration of a DatabaseManager operation while stats are enabled.
+    For generators, only the time spent producing items is recorded.
+    """
+    name = func.__name__
+
+    if isgeneratorfunction(func):
+
+        @wraps(func)
+        def generator_wrapper(*args, **kwargs):
+            if not stats.enabled:
+                yield from func(*args, **kwargs)
+                return
+
+            items = func(*args, **kwargs)
+            elapsed = 0
+            try:
+                while True:
+                    start = time.perf_counter()
+                    try:
+                        item = next(items)
+                    except StopIteration:
+                        return
+                    finally:
+                        elapsed += time.perf_counter() - start
+                    yield item
+            finally:
+                items.close()
+                stats.record_operation(name, elapsed)
+
+        return generator_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        if not stats.enabled:
+            return func(*args, **kwargs)
+
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            stats.record_operation(name, time.perf_counter() - start)
+
+    return wrapper
+
+
+stats = Stats()